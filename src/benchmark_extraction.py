@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file benchmarks the extraction paths of scraper_tripadvisor.py offline, on recorded
+HTML fixtures (src/benchmark_fixtures): a restaurant page with reviews, a page of search
+results and a member overlay. Nothing is requested from Tripadvisor.
+
+Extraction paths (TRIPADVISOR_EXTRACTION and the parser alone):
+- webdriver: fetch_data_attribute() per attribute on the fixture loaded as file:// page
+- snapshot: one page_source/outerHTML call, parsed locally (tripadvisor_parser)
+- js: one JavaScript call per page (JS_EXTRACT_*), records converted locally
+- parse: parsing of the fixture file only (no browser, lower bound of snapshot)
+
+Each path is timed per page and per review (median over repetitions) and its values are
+compared with the parse path, so that regressions in speed and results show up before a
+crawl. Results are saved as JSON:
+
+    python src/benchmark_extraction.py [--repeat 20] [--no-browser] [--output path]
+
+Fixtures are recorded from live pages (one restaurant page, its member overlay and the
+results page of a search) with:
+
+    python src/benchmark_extraction.py --record <restaurant url> <results url>
+
+'''
+
+# imports
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+from datetime import datetime
+
+# working dir (Jupyter proof), add src to import search locations
+try:
+    wd = str(Path(__file__).parents[1].absolute()) + '/'
+except NameError:
+    wd = str(Path().absolute()) + '/'
+    print('You seem to be using a Jupyter environment.'
+          'Make sure this points to the repository root: '
+          + wd)
+sys.path.append(wd + 'src')
+import tripadvisor_parser
+import scraper_tripadvisor as scraper
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+
+path_fixtures = wd + 'src/benchmark_fixtures/'
+fixtures = {
+    'restaurant': 'restaurant.html',
+    'results_page': 'results_page.html',
+    'member_overlay': 'member_overlay.html',
+    }
+attributes_restaurant = [
+    'name', 'street_w_no', 'postcode', 'cuisine1', 'cuisine2', 'cuisine3',
+    'pricerange_lo', 'pricerange_hi'
+    ]
+# review attributes with the fallback used in the review loop (user info if overlay fails)
+attributes_review = [
+    ('review_user_id', 0), ('review_date', 0), ('review_score', 0), ('review_title', 0),
+    ('review_text', 0), ('review_id', 0), ('review_user_name', 1), ('review_user_reviews', 1)
+    ]
+attributes_user_overlay = [
+    'review_user_name', 'review_user_gender', 'review_user_age', 'review_user_municipality',
+    'review_user_country', 'review_user_signup', 'review_user_reviews',
+    'review_user_thumbsup', 'review_user_municipalities_visited'
+    ]
+
+##### FUNCTIONS #####
+
+def read_fixture(name):
+    with open(path_fixtures + fixtures[name], encoding='utf-8') as f:
+        return f.read()
+
+def review_records(rev_data_list):
+    return [
+        [scraper.fetch_data_attribute(element=rev_data, attr=attr, fallback=fallback)
+         for attr, fallback in attributes_review]
+        for rev_data in rev_data_list
+        ]
+
+def extract_restaurant(mode, html=None):
+    # restaurant attributes and all reviews on the page
+    if (mode == 'parse'):
+        page = tripadvisor_parser.snapshot(html)
+        rev_data_list = tripadvisor_parser.review_containers(page)
+    elif (mode == 'snapshot'):
+        page = scraper.page_snapshot()
+        rev_data_list = tripadvisor_parser.review_containers(scraper.page_snapshot(
+            scraper.driver.find_element(By.CSS_SELECTOR, 'div.listContainer')
+            ))
+    elif (mode == 'js'):
+        page = scraper.driver
+        rev_data_list = scraper.fetch_reviews_js()
+    else:
+        page = scraper.driver
+        rev_data_list = scraper.driver.find_elements(
+            By.CSS_SELECTOR, 'div.listContainer div.review-container'
+            )
+    # restaurant attributes are read via WebDriver in the js mode (as in the scraper)
+    restaurant = [scraper.fetch_data_attribute(element=page, attr=attr, fallback=0)
+                  for attr in attributes_restaurant]
+    return [restaurant] + review_records(rev_data_list)
+
+def extract_results_page(mode, html=None):
+    # restaurant names and ids of a search results page
+    data = {key: [] for key in
+            ['municipality', 'ags', 'name', 'url', 'id', 'timestamp', 'scraped']}
+    if (mode == 'webdriver'):
+        scraper.get_restaurant_info_from_results_page(
+            data_dict=data, municipality='', ags='', postcodes=[], scraped=None
+            )
+    else:
+        page = (tripadvisor_parser.snapshot(html) if (mode == 'parse')
+                else scraper.page_snapshot())
+        scraper.get_restaurant_info_from_results_snapshot(
+            data_dict=data, results_page=page, municipality='', ags='', scraped=None
+            )
+    return [list(row) for row in zip(data['name'], data['id'])]
+
+def extract_member_overlay(mode, html=None):
+    if (mode == 'parse'):
+        overlay = tripadvisor_parser.snapshot(html).select_one('span.ui_popover div.memberOverlay')
+    else:
+        overlay = scraper.driver.find_element(By.CSS_SELECTOR, 'span.ui_popover div.memberOverlay')
+        if (mode == 'snapshot'):
+            overlay = scraper.page_snapshot(overlay)
+        elif (mode == 'js'):
+            overlay = scraper.fetch_member_overlay_js(overlay)
+    return [[scraper.fetch_data_attribute(element=overlay, attr=attr, fallback=0)
+             for attr in attributes_user_overlay]]
+
+extractors = {
+    'restaurant': extract_restaurant,
+    'results_page': extract_results_page,
+    'member_overlay': extract_member_overlay,
+    }
+
+def comparable(records):
+    # values as strings (np.nan != np.nan)
+    return [[str(value) for value in record] for record in records]
+
+def time_extraction(extractor, mode, repeat, html=None):
+    seconds = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        records = extractor(mode, html)
+        seconds.append(time.perf_counter() - time_start)
+    return seconds, records
+
+def run_benchmark(modes, repeat):
+    results = {}
+    for fixture, extractor in extractors.items():
+        html = read_fixture(fixture)
+        if (len(modes) > 1):
+            scraper.driver.get(Path(path_fixtures + fixtures[fixture]).as_uri())
+        results[fixture] = {}
+        reference = None
+        for mode in modes:
+            seconds, records = time_extraction(extractor, mode, repeat, html)
+            # reviews (restaurant page: first record holds the restaurant attributes)
+            n_items = max(len(records) - 1, 1) if (fixture == 'restaurant') else len(records)
+            if (reference is None):
+                reference = comparable(records)
+            results[fixture][mode] = {
+                'items': n_items,
+                'page_ms_median': 1000 * statistics.median(seconds),
+                'page_ms_min': 1000 * min(seconds),
+                'item_ms_median': 1000 * statistics.median(seconds) / max(n_items, 1),
+                'consistent_with_parse': comparable(records) == reference,
+                }
+            print('%-15s %-10s %9.2f ms/page %8.3f ms/item %s'
+                  % (fixture, mode, results[fixture][mode]['page_ms_median'],
+                     results[fixture][mode]['item_ms_median'],
+                     '' if results[fixture][mode]['consistent_with_parse']
+                     else '(values differ from parse)'))
+    return results
+
+def record_fixtures(url_restaurant, url_results):
+    # save page sources of live pages as fixtures (throttled like the scraper)
+    scraper.load_page(url_restaurant + '#REVIEWS')
+    scraper.accept_cookies()
+    scraper.expand_teaser_text()
+    with open(path_fixtures + fixtures['restaurant'], 'w', encoding='utf-8') as f:
+        f.write(scraper.driver.page_source)
+    rev = scraper.driver.find_element(By.CSS_SELECTOR, 'div.listContainer div.review-container')
+    scraper.driver.execute_script(
+        'arguments[0].click();',
+        rev.find_element(By.CSS_SELECTOR, 'div.memberOverlayLink.clickable')
+        )
+    scraper.wait.until(EC.visibility_of_element_located(
+        (By.CSS_SELECTOR, 'span.ui_popover div.memberOverlay h3.username')
+        ))
+    overlay = scraper.driver.find_element(By.CSS_SELECTOR, 'span.ui_popover')
+    with open(path_fixtures + fixtures['member_overlay'], 'w', encoding='utf-8') as f:
+        f.write('<!DOCTYPE html>\n<html lang="de">\n<head><meta charset="utf-8"></head>\n<body>\n'
+                + overlay.get_attribute('outerHTML') + '\n</body>\n</html>\n')
+    scraper.load_page(url_results)
+    with open(path_fixtures + fixtures['results_page'], 'w', encoding='utf-8') as f:
+        f.write(scraper.driver.page_source)
+    print('Fixtures recorded: ' + ', '.join(fixtures.values()))
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description='Benchmark Tripadvisor extraction paths.')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--no-browser', action='store_true', help='only time the parser')
+    parser.add_argument('--record', nargs=2, metavar=('URL_RESTAURANT', 'URL_RESULTS'))
+    parser.add_argument('--output', default=wd + 'results/misc/benchmark_extraction.json')
+    args = parser.parse_args()
+    modes = ['parse']
+    if ((args.no_browser == False) | (args.record is not None)):
+        scraper.driver, scraper.wait = scraper.start_driver()
+        modes = ['parse', 'snapshot', 'js', 'webdriver']
+    try:
+        if (args.record is not None):
+            record_fixtures(*args.record)
+        else:
+            results = {
+                'timestamp': datetime.now().strftime('%Y-%m-%d, %H:%M:%S'),
+                'repeat': args.repeat,
+                'fixtures': run_benchmark(modes, args.repeat),
+                }
+            os.makedirs(os.path.dirname(args.output), exist_ok=True)
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            print('Saved: ' + args.output)
+    finally:
+        if (len(modes) > 1):
+            scraper.quit_browsers()
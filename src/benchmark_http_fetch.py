@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file checks and benchmarks the HTTP fetch path of scraper_tripadvisor.py
+(TRIPADVISOR_FETCH=http) against the local fixture server (src/fixture_server.py), which
+serves the recorded pages in src/benchmark_fixtures. Nothing is requested from Tripadvisor.
+
+Per repetition, the results page is loaded with load_html() and its restaurants are read
+with get_restaurant_info_from_results_snapshot(), the postcode of the first restaurant is
+checked with check_postcode_match() (Berlin, 11000000) and a block page has to raise. The
+postcode index is the regular one if data/raw/zuordnung_plz_ort.csv exists, an index of
+the fixture postcode otherwise. Results are saved as JSON:
+
+    python src/benchmark_http_fetch.py [--repeat 20] [--output path]
+
+'''
+
+# imports
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+
+# working dir (Jupyter proof), add src to import search locations
+try:
+    wd = str(Path(__file__).parents[1].absolute()) + '/'
+except NameError:
+    wd = str(Path().absolute()) + '/'
+    print('You seem to be using a Jupyter environment.'
+          'Make sure this points to the repository root: '
+          + wd)
+sys.path.append(wd + 'src')
+import fixture_server
+import postcode_index
+import scraper_tripadvisor as scraper
+from throttle import Throttle
+
+# municipality of the recorded results page
+municipality, ags = 'Berlin', '11000000'
+
+##### FUNCTIONS #####
+
+def prepare_scraper(base_url):
+    # HTTP backend against the fixture server, no throttle delays (local server)
+    scraper.fetch_backend = 'http'
+    scraper.base_url = base_url
+    scraper.throttle = Throttle(interval=0.0, min_interval=0.0)
+    if (os.path.exists(wd + 'data/raw/zuordnung_plz_ort.csv') == False):
+        scraper.postcode_ags = postcode_index.PostcodeIndex(
+            np.array([10115 * postcode_index.PostcodeIndex.factor + int(ags)], dtype=np.int64),
+            np.array([int(ags)], dtype=np.int64), np.array(['berlin'])
+            )
+
+def run_once(base_url):
+    # one pass, returns seconds per step and the checked values
+    seconds = {}
+    time_start = time.perf_counter()
+    html = scraper.load_html(base_url + '/Restaurants-g187323-Berlin.html')
+    seconds['load_html'] = time.perf_counter() - time_start
+    time_start = time.perf_counter()
+    data_dict = {key: [] for key in [
+        'name', 'url', 'timestamp', 'municipality', 'ags', 'id', 'scraped'
+        ]}
+    scraper.get_restaurant_info_from_results_snapshot(
+        data_dict, scraper.tripadvisor_parser.snapshot(html), municipality, ags, np.nan
+        )
+    seconds['results_snapshot'] = time.perf_counter() - time_start
+    time_start = time.perf_counter()
+    postcode_match = scraper.check_postcode_match(data_dict['url'][0], ags)
+    seconds['postcode_match'] = time.perf_counter() - time_start
+    try:
+        scraper.load_html(base_url + '/blocked')
+        block_detected = False
+    except scraper.TimeoutException:
+        block_detected = True
+    return seconds, data_dict, postcode_match, block_detected
+
+def run_benchmark(repeat):
+    server, base_url = fixture_server.start_server()
+    prepare_scraper(base_url)
+    try:
+        runs = [run_once(base_url) for _ in range(repeat)]
+    finally:
+        server.shutdown()
+        server.server_close()
+    seconds, data_dict, postcode_match, block_detected = runs[-1]
+    consistent = (
+        (len(data_dict['url']) > 0)
+        & all(url.startswith(base_url + '/Restaurant_Review-') for url in data_dict['url'])
+        & all(run[2] for run in runs) & all(run[3] for run in runs)
+        )
+    results = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d, %H:%M:%S'),
+        'base_url': base_url,
+        'restaurants': len(data_dict['url']),
+        'postcode_match': postcode_match,
+        'block_detected': block_detected,
+        'consistent': consistent,
+        }
+    for step in seconds.keys():
+        results[step + '_ms_median'] = 1000 * statistics.median(run[0][step] for run in runs)
+        print('%-17s %8.2f ms' % (step, results[step + '_ms_median']))
+    print('%i restaurants, postcode match %s, block page detected %s %s'
+          % (results['restaurants'], postcode_match, block_detected,
+             '' if consistent else '(unexpected results)'))
+    return results
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description='Check the HTTP fetch path on fixtures.')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', default=wd + 'results/misc/benchmark_http_fetch.json')
+    args = parser.parse_args()
+    results = run_benchmark(args.repeat)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Saved: ' + args.output)
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file benchmarks the lean browser profile against the full profile.
+
+Each restaurant page is loaded once per profile (alternating, caches disabled) and the
+Navigation/Resource Timing API is read: bytes transferred, number of requests and page
+load time (until the load event). Cross-origin resources without Timing-Allow-Origin
+report a transfer size of 0, so bytes are a lower bound for the full profile.
+
+Restaurant URLs are sampled from the checkpoint store (or passed as arguments):
+
+    python src/benchmark_lean_profile.py [n_restaurants | url ...]
+
+Results are saved to results/misc/benchmark_lean_profile.json.
+
+'''
+
+# imports
+import os
+import sys
+import json
+import time
+import sqlite3
+import statistics
+from pathlib import Path
+from datetime import datetime
+from selenium import webdriver
+
+# working dir (Jupyter proof), add src to import search locations
+try:
+    wd = str(Path(__file__).parents[1].absolute()) + '/'
+except NameError:
+    wd = str(Path().absolute()) + '/'
+    print('You seem to be using a Jupyter environment.'
+          'Make sure this points to the repository root: '
+          + wd)
+sys.path.append(wd + 'src')
+import browser
+from throttle import Throttle
+
+# same base options as the scraper, no caching between pages
+options = webdriver.FirefoxOptions()
+options.set_preference('intl.accept_languages', 'de-DE, de')
+options.set_preference('browser.cache.disk.enable', False)
+options.set_preference('browser.cache.memory.enable', False)
+options.headless = True
+profiles = {
+    'full': options,
+    'lean': browser.lean_options(
+        options, wd + 'data/temp/lean_blocklist_benchmark.pac',
+        blocklist=browser.blocked_domains + ['maps.googleapis.com', 'maps.gstatic.com']
+        ),
+    }
+throttle = Throttle(interval=3.0)
+
+# page weight and load time of the current page
+JS_PAGE_WEIGHT = '''
+const navigation = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = navigation.transferSize;
+for (const resource of resources) {
+    bytes += resource.transferSize;
+}
+return {
+    bytes: bytes,
+    requests: resources.length + 1,
+    dom_ms: navigation.domContentLoadedEventEnd - navigation.startTime,
+    load_ms: navigation.loadEventEnd - navigation.startTime
+};
+'''
+
+##### FUNCTIONS #####
+
+def sample_restaurant_urls(n):
+    # random sample of restaurant URLs from the checkpoint store
+    con = sqlite3.connect(wd + 'data/raw/tripadvisor_checkpoints.sqlite')
+    urls = [row[0] for row in con.execute(
+        'SELECT url FROM restaurants ORDER BY RANDOM() LIMIT ?', (n,)
+        )]
+    con.close()
+    return urls
+
+def measure_page(driver, url):
+    throttle.wait('page')
+    time_start = time.perf_counter()
+    driver.get(url + '#REVIEWS')
+    seconds_get = time.perf_counter() - time_start
+    # loadEventEnd is 0 until the load event has finished
+    for _ in range(50):
+        record = driver.execute_script(JS_PAGE_WEIGHT)
+        if (record['load_ms'] > 0):
+            break
+        time.sleep(0.1)
+    record['get_s'] = seconds_get
+    return record
+
+def summary(records):
+    return {
+        'pages': len(records),
+        'bytes_median': statistics.median([r['bytes'] for r in records]),
+        'requests_median': statistics.median([r['requests'] for r in records]),
+        'load_ms_median': statistics.median([r['load_ms'] for r in records]),
+        'get_s_median': statistics.median([r['get_s'] for r in records]),
+        }
+
+def run_benchmark(urls):
+    path_geckodriver = browser.geckodriver_path(wd + 'data/temp/geckodriver_path.txt')
+    drivers = {
+        profile: browser.start_browser(profile_options, path_geckodriver)
+        for profile, profile_options in profiles.items()
+        }
+    records = {profile: [] for profile in profiles.keys()}
+    try:
+        for i, url in enumerate(urls):
+            # alternate order, so neither profile profits from server-side caching
+            order = list(profiles.keys()) if (i % 2 == 0) else list(profiles.keys())[::-1]
+            for profile in order:
+                record = measure_page(drivers[profile], url)
+                record['url'] = url
+                records[profile].append(record)
+                print('%-5s %8.0f kB %4i requests %6.0f ms  %s'
+                      % (profile, record['bytes']/1000, record['requests'],
+                         record['load_ms'], url))
+    finally:
+        for driver in drivers.values():
+            browser.quit_browser(driver)
+    return {
+        'timestamp': datetime.now().strftime('%Y-%m-%d, %H:%M:%S'),
+        'summary': {profile: summary(records[profile]) for profile in records.keys()},
+        'pages': records,
+        }
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    if ((len(sys.argv) > 1) and (sys.argv[1].startswith('http'))):
+        urls = sys.argv[1:]
+    else:
+        urls = sample_restaurant_urls(int(sys.argv[1]) if (len(sys.argv) > 1) else 20)
+    results = run_benchmark(urls)
+    for profile, profile_summary in results['summary'].items():
+        print(profile + ': ' + json.dumps(profile_summary))
+    os.makedirs(wd + 'results/misc', exist_ok=True)
+    with open(wd + 'results/misc/benchmark_lean_profile.json', 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Saved: results/misc/benchmark_lean_profile.json')
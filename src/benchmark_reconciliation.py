@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file benchmarks the reconciliation of the municipality query log with the user input
+(step (1) of init_scraper in scraper_tripadvisor.py) at full-Germany size (~11,000
+municipalities). Nothing is requested from Tripadvisor.
+
+The input is synthetic: n municipalities with 8-digit AGS and postcodes, a query log that
+knows most of them, some user provided query strings and some postcode flags (missing
+query strings). reconcile_municipalities() is timed against the former row loop (one scan
+of the query log, one concat or column mask per row) and both results are compared:
+
+    python src/benchmark_reconciliation.py [--municipalities 11000] [--repeat 5]
+
+Results are saved to results/misc/benchmark_reconciliation.json.
+
+'''
+
+# imports
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import statistics
+from pathlib import Path
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# working dir (Jupyter proof), add src to import search locations
+try:
+    wd = str(Path(__file__).parents[1].absolute()) + '/'
+except NameError:
+    wd = str(Path().absolute()) + '/'
+    print('You seem to be using a Jupyter environment.'
+          'Make sure this points to the repository root: '
+          + wd)
+sys.path.append(wd + 'src')
+import scraper_tripadvisor as scraper
+
+columns = ['ags', 'municipality', 'state', 'postcodes', 'querystring',
+           'scraping_targets', 'scraped']
+states = ['Bayern', 'Baden-Württemberg', 'Niedersachsen', 'Sachsen', 'Brandenburg']
+
+##### FUNCTIONS #####
+
+def synthetic_input(n, share_known=0.9, share_user=0.02, share_flagged=0.01, seed=1):
+    # input municipalities and a query log which knows share_known of them
+    rng = random.Random(seed)
+    df_input = pd.DataFrame({
+        'ags': ['%08i' % (1000000 + 97 * i) for i in range(n)],
+        'municipality': ['Gemeinde ' + str(i) for i in range(n)],
+        'state': [rng.choice(states) for _ in range(n)],
+        'postcodes': [['%05i' % rng.randrange(1000, 99999)
+                       for _ in range(rng.randint(1, 3))] for _ in range(n)],
+        })
+    df_input['querystring'] = df_input['municipality'] + ' ' + df_input['state']
+    df_query = df_input[[rng.random() < share_known for _ in range(n)]].copy()
+    df_query['scraping_targets'] = np.nan
+    df_query['scraped'] = np.nan
+    df_query = df_query[columns].reset_index(drop=True)
+    for i in range(n):
+        draw = rng.random()
+        if (draw < share_user):
+            df_input.loc[i, 'querystring'] = 'Restaurants ' + df_input.loc[i, 'municipality']
+        elif (draw < share_user + share_flagged):
+            df_input.loc[i, 'querystring'] = np.nan
+    return df_query, df_input
+
+def reconcile_municipalities_loop(df_query_municipalities, df_input_municipalities):
+    # former row loop of init_scraper (reference)
+    for municipality, ags, postcodes, state, querystring in zip(
+            df_input_municipalities['municipality'],
+            df_input_municipalities['ags'],
+            df_input_municipalities['postcodes'],
+            df_input_municipalities['state'],
+            df_input_municipalities['querystring']
+            ):
+        if (ags not in df_query_municipalities['ags'].values):
+            if (pd.isnull(querystring)):
+                querystring = municipality + ' ' + state
+            df_query_municipalities_row = pd.DataFrame(
+                [[ags, municipality, state, postcodes, querystring, np.nan, np.nan]],
+                columns=columns
+                )
+            df_query_municipalities = pd.concat(
+                [df_query_municipalities, df_query_municipalities_row],
+                ignore_index=True
+                )
+        if ((querystring not in df_query_municipalities['querystring'].values)
+                & (pd.isnull(querystring) == False)):
+            df_query_municipalities['querystring'] = df_query_municipalities['querystring'].mask(
+                df_query_municipalities['ags'] == ags, querystring
+                )
+        elif (pd.isnull(querystring)):
+            df_query_municipalities['querystring'] = df_query_municipalities['querystring'].mask(
+                df_query_municipalities['ags'] == ags, querystring
+                )
+    return df_query_municipalities
+
+def time_reconciliation(func, df_query, df_input, repeat):
+    seconds = []
+    for _ in range(repeat):
+        time_start = time.perf_counter()
+        result = func(df_query.copy(), df_input)
+        seconds.append(time.perf_counter() - time_start)
+    return seconds, result
+
+def run_benchmark(n, repeat):
+    df_query, df_input = synthetic_input(n)
+    seconds_vectorized, (df_vectorized, added, changed_user, changed_postcode_flag) = \
+        time_reconciliation(scraper.reconcile_municipalities, df_query, df_input, repeat)
+    # the loop is timed at most 3 times (minutes at full size)
+    seconds_loop, df_loop = time_reconciliation(
+        reconcile_municipalities_loop, df_query, df_input, min(repeat, 3)
+        )
+    consistent = df_vectorized[columns].astype(str).equals(df_loop[columns].astype(str))
+    results = {
+        'timestamp': datetime.now().strftime('%Y-%m-%d, %H:%M:%S'),
+        'municipalities_input': n,
+        'municipalities_logged': len(df_query),
+        'added': added,
+        'changed_user': changed_user,
+        'changed_postcode_flag': changed_postcode_flag,
+        'vectorized_ms_median': 1000 * statistics.median(seconds_vectorized),
+        'loop_ms_median': 1000 * statistics.median(seconds_loop),
+        'consistent_with_loop': consistent,
+        }
+    print('%i municipalities (%i logged): %i added, %i changed, %i flagged'
+          % (n, len(df_query), added, changed_user, changed_postcode_flag))
+    print('vectorized %9.1f ms, loop %9.1f ms (x%.0f) %s'
+          % (results['vectorized_ms_median'], results['loop_ms_median'],
+             results['loop_ms_median'] / results['vectorized_ms_median'],
+             '' if consistent else '(results differ from loop)'))
+    return results
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description='Benchmark municipality reconciliation.')
+    parser.add_argument('--municipalities', type=int, default=11000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default=wd + 'results/misc/benchmark_reconciliation.json')
+    args = parser.parse_args()
+    results = run_benchmark(args.municipalities, args.repeat)
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Saved: ' + args.output)
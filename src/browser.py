@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file starts Firefox instances for the scrapers with as little startup cost as possible.
+
+- The geckodriver path is resolved once by webdriver_manager and cached in a text file,
+  later starts (and restarts after crashes) need neither the network nor the lookup.
+- A warm profile template keeps cookies (e.g. the accepted cookie consent) and the HTTP
+  cache between runs. Each browser runs on a copy of the template, as Firefox locks a
+  profile while it is in use.
+- BrowserFactory keeps a spare browser which is started in the background, so get()
+  returns a ready browser instead of waiting for Firefox to launch.
+- lean_options() turns the options into a profile for text-only scraping: no images, 
+  media and web fonts, requests to ad/tracking domains are blocked (PAC file pointing to 
+  a dead proxy), optionally no stylesheets.
+
+    factory = BrowserFactory(options, path_geckodriver_cache, path_profile_template)
+    driver = factory.get() # spare browser, next one is started in the background
+    ...
+    quit_browser(driver)
+    factory.close()
+
+'''
+
+# imports
+import os
+import copy
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from selenium import webdriver
+from selenium.webdriver.firefox.service import Service
+from webdriver_manager.firefox import GeckoDriverManager
+
+# third-party ad/tracking domains blocked by the lean profile (subdomains included), 
+# consent (cookielaw.org) and bot protection (captcha-delivery.com) have to stay reachable
+blocked_domains = [
+    'doubleclick.net', 'googlesyndication.com', 'googletagservices.com', 
+    'googletagmanager.com', 'google-analytics.com', 'googleadservices.com', 
+    'adnxs.com', 'adsrvr.org', 'amazon-adsystem.com', 'casalemedia.com', 'criteo.com', 
+    'criteo.net', 'demdex.net', 'omtrdc.net', 'everesttech.net', 'facebook.net', 
+    'facebook.com', 'hotjar.com', 'moatads.com', 'outbrain.com', 'taboola.com', 
+    'pubmatic.com', 'rubiconproject.com', 'openx.net', 'scorecardresearch.com', 
+    'quantserve.com', 'bing.com', 'yieldmo.com', 'media.net', 'teads.tv'
+    ]
+
+##### FUNCTIONS #####
+
+def geckodriver_path(path_cache):
+    # path of the geckodriver binary, resolved via webdriver_manager only if not cached
+    if (os.path.exists(path_cache)):
+        with open(path_cache) as f:
+            path = f.read().strip()
+        if (os.path.exists(path)):
+            return path
+    path = GeckoDriverManager().install()
+    os.makedirs(os.path.dirname(path_cache), exist_ok=True)
+    with open(path_cache, 'w') as f:
+        f.write(path)
+    return path
+
+def with_profile(options, path_profile):
+    # copy of the options which runs Firefox on the given profile directory
+    options = copy.deepcopy(options)
+    options.add_argument('-profile')
+    options.add_argument(path_profile)
+    return options
+
+def read_blocklist(path):
+    # one domain per line, '#' starts a comment
+    with open(path) as f:
+        lines = [line.split('#')[0].strip() for line in f]
+    return [line for line in lines if (line != '')]
+
+def write_pac_file(path_pac, blocklist):
+    # proxy auto-config: blocked domains go to a closed local port (fail immediately)
+    os.makedirs(os.path.dirname(path_pac), exist_ok=True)
+    with open(path_pac, 'w') as f:
+        f.write('var blocked = ' + json.dumps(sorted(set(blocklist))) + ';\n'
+                'function FindProxyForURL(url, host) {\n'
+                '    for (var i = 0; i < blocked.length; i++) {\n'
+                '        if ((host == blocked[i]) || dnsDomainIs(host, "." + blocked[i])) {\n'
+                '            return "PROXY 127.0.0.1:9";\n'
+                '        }\n'
+                '    }\n'
+                '    return "DIRECT";\n'
+                '}\n')
+
+def lean_options(options, path_pac, blocklist=blocked_domains, block_stylesheets=False):
+    '''
+    Copy of the options for text-only scraping (the scrapers only read the DOM):
+    no images, no media (autoplay/preload), no web fonts, ad/tracking domains blocked.
+    Stylesheets are kept by default, as visibility waits and overlay clicks depend on the
+    layout.
+    '''
+    options = copy.deepcopy(options)
+    options.set_preference('permissions.default.image', 2)
+    options.set_preference('media.autoplay.default', 5)
+    options.set_preference('media.preload.default', 0)
+    options.set_preference('media.preload.auto', 0)
+    options.set_preference('gfx.downloadable_fonts.enabled', False)
+    options.set_preference('browser.display.use_document_fonts', 0)
+    write_pac_file(path_pac, blocklist)
+    options.set_preference('network.proxy.type', 2)
+    options.set_preference('network.proxy.autoconfig_url', Path(path_pac).as_uri())
+    if (block_stylesheets == True):
+        options.set_preference('permissions.default.stylesheet', 2)
+    return options
+
+def create_profile_template(options, path_geckodriver, path_template, warm_up):
+    '''
+    Create the profile template once: Firefox runs directly on the template directory,
+    warm_up(driver) visits the site (e.g. accepts the cookie consent), cookies and cache
+    are written to the template when the browser quits. Returns False if it exists already.
+    '''
+    if (os.path.exists(path_template)):
+        return False
+    os.makedirs(path_template)
+    driver = webdriver.Firefox(
+        service=Service(path_geckodriver), options=with_profile(options, path_template)
+        )
+    try:
+        warm_up(driver)
+    except Exception:
+        driver.quit()
+        shutil.rmtree(path_template, ignore_errors=True)
+        raise
+    driver.quit()
+    return True
+
+def start_browser(options, path_geckodriver, path_template=None):
+    # start Firefox (on a copy of the profile template if there is one)
+    if ((path_template is None) or (os.path.exists(path_template) == False)):
+        driver = webdriver.Firefox(service=Service(path_geckodriver), options=options)
+        driver.profile_copy = None
+        return driver
+    path_profile = tempfile.mkdtemp(prefix='firefox_profile_')
+    shutil.copytree(
+        path_template, path_profile, dirs_exist_ok=True,
+        ignore=shutil.ignore_patterns('lock', '.parentlock', 'parent.lock')
+        )
+    driver = webdriver.Firefox(
+        service=Service(path_geckodriver), options=with_profile(options, path_profile)
+        )
+    driver.profile_copy = path_profile
+    return driver
+
+def quit_browser(driver):
+    # quit Firefox and remove its profile copy
+    try:
+        driver.quit()
+    finally:
+        if (getattr(driver, 'profile_copy', None) is not None):
+            shutil.rmtree(driver.profile_copy, ignore_errors=True)
+
+##### CLASSES #####
+
+class BrowserFactory:
+
+    def __init__(self, options, path_geckodriver_cache, path_template=None, spare=True):
+        self.options = options
+        self.path_geckodriver = geckodriver_path(path_geckodriver_cache)
+        self.path_template = path_template
+        self.spare = spare
+        self.pid = os.getpid() # spare browsers belong to the creating process
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.next_browser = None
+        if (self.spare == True):
+            self.start_spare()
+
+    def start_spare(self):
+        self.next_browser = self.executor.submit(
+            start_browser, self.options, self.path_geckodriver, self.path_template
+            )
+
+    def get(self):
+        # ready browser (the spare one if available), starts the next spare in the background
+        if (self.pid != os.getpid()):
+            # copied into a forked process: spare and executor thread are the parent's
+            self.pid = os.getpid()
+            self.executor = ThreadPoolExecutor(max_workers=1)
+            self.next_browser = None
+        if (self.next_browser is None):
+            driver = start_browser(self.options, self.path_geckodriver, self.path_template)
+        else:
+            try:
+                driver = self.next_browser.result()
+            except Exception:
+                # spare browser failed to start (e.g. crashed Firefox), try once more
+                driver = start_browser(
+                    self.options, self.path_geckodriver, self.path_template
+                    )
+        if (self.spare == True):
+            self.start_spare()
+        else:
+            self.next_browser = None
+        return driver
+
+    def close(self, timeout=60):
+        # quit the spare browser (waits at most timeout seconds for it to start), a factory 
+        # copied into a forked process leaves the spare to its owner
+        if (self.pid != os.getpid()):
+            self.next_browser = None
+            return
+        if (self.next_browser is not None):
+            try:
+                quit_browser(self.next_browser.result(timeout))
+            except Exception:
+                pass
+            self.next_browser = None
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file keeps the scraping progress in a SQLite database (WAL mode).
+
+It replaces the 'scraping_targets'/'scraped' columns of the CSV query logs as the
+source of truth. Every update is a single small transaction, so the cost does not grow
+with the size of the lists, and several processes (browser workers, scraper instances)
+can claim and complete restaurants concurrently without overwriting each other.
+
+Claims are leases: a claim older than lease_seconds (e.g. of a crashed process) can be
+taken over by another worker. Workers renew their lease while scraping.
+
+Reviews are checkpointed per restaurant, language and page while scraping, so a restaurant
+interrupted by a crash resumes after its last completed page instead of starting over.
+
+'''
+
+# imports
+import os
+import json
+import time
+import socket
+import sqlite3
+from ast import literal_eval
+import numpy as np
+import pandas as pd
+
+##### FUNCTIONS #####
+
+columns_municipalities = [
+    'ags', 'municipality', 'state', 'postcodes', 'querystring', 'scraping_targets', 'scraped'
+    ]
+columns_restaurants = ['municipality', 'ags', 'name', 'url', 'id', 'timestamp', 'scraped']
+
+def worker_name():
+    # identifies the claiming process (host and pid)
+    return socket.gethostname() + ':' + str(os.getpid())
+
+def connect(path):
+    # open store, create tables if necessary (one connection per process, may be used by 
+    # another thread than the creating one, but never by two threads at once)
+    con = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+    con.execute('PRAGMA journal_mode=WAL')
+    con.execute('PRAGMA synchronous=NORMAL')
+    con.execute('''
+        CREATE TABLE IF NOT EXISTS municipalities (
+            ags TEXT PRIMARY KEY,
+            municipality TEXT,
+            state TEXT,
+            postcodes TEXT,
+            querystring TEXT,
+            scraping_targets TEXT,
+            scraped TEXT
+        )''')
+    con.execute('''
+        CREATE TABLE IF NOT EXISTS restaurants (
+            ags TEXT,
+            id TEXT,
+            municipality TEXT,
+            name TEXT,
+            url TEXT,
+            timestamp TEXT,
+            scraped TEXT,
+            claimed_by TEXT,
+            claimed_at REAL,
+            PRIMARY KEY (ags, id)
+        )''')
+    con.execute('CREATE INDEX IF NOT EXISTS restaurants_open ON restaurants (scraped, ags)')
+    con.execute('''
+        CREATE TABLE IF NOT EXISTS review_pages (
+            ags TEXT,
+            id TEXT,
+            language TEXT,
+            page INTEGER,
+            reviews TEXT,
+            last INTEGER,
+            PRIMARY KEY (ags, id, language, page)
+        )''')
+    return con
+
+def to_sql(value):
+    # pandas missings -> NULL
+    if ((value is None) or ((not isinstance(value, (list, str))) and pd.isnull(value))):
+        return None
+    return value
+
+def postcodes_to_sql(postcodes):
+    # postcode lists are stored as JSON arrays
+    if (isinstance(postcodes, str)):
+        postcodes = literal_eval(postcodes)
+    return json.dumps([str(p) for p in postcodes])
+
+def is_empty(con):
+    return con.execute('SELECT COUNT(*) FROM municipalities').fetchone()[0] == 0
+
+def read_municipalities(con):
+    # municipality query log as DataFrame (missings as np.nan, postcodes as lists)
+    df = pd.read_sql_query(
+        'SELECT ' + ', '.join(columns_municipalities) + ' FROM municipalities ORDER BY rowid',
+        con
+        )
+    df['postcodes'] = df['postcodes'].apply(json.loads)
+    return df.fillna(value=np.nan)
+
+def upsert_municipalities(con, df):
+    # add new municipalities and update name/state/postcodes/querystring of known ones,
+    # progress columns are left untouched
+    rows = [
+        (ags, municipality, state, postcodes_to_sql(postcodes), to_sql(querystring))
+        for ags, municipality, state, postcodes, querystring in zip(
+            df['ags'], df['municipality'], df['state'], df['postcodes'], df['querystring']
+            )
+        ]
+    with con:
+        con.execute('BEGIN IMMEDIATE')
+        con.executemany('''
+            INSERT INTO municipalities (ags, municipality, state, postcodes, querystring)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT (ags) DO UPDATE SET
+                municipality = excluded.municipality,
+                state = excluded.state,
+                postcodes = excluded.postcodes,
+                querystring = excluded.querystring
+            ''', rows)
+
+def set_municipality(con, ags, column, value):
+    # O(1) update of a single field (e.g. scraped = path of merged dataset)
+    assert column in columns_municipalities
+    with con:
+        con.execute(
+            'UPDATE municipalities SET ' + column + ' = ? WHERE ags = ?', (to_sql(value), ags)
+            )
+
+def count_scraped_municipalities(con):
+    return con.execute(
+        'SELECT COUNT(scraped), COUNT(*) FROM municipalities'
+        ).fetchone()
+
+def count_scraped_restaurants(con):
+    return con.execute('SELECT COUNT(scraped) FROM restaurants').fetchone()[0]
+
+def add_restaurants(con, ags, df, relpath_targets):
+    # save scraping targets of a municipality and mark targets as collected (atomic)
+    rows = [
+        tuple(to_sql(value) for value in row)
+        for row in zip(
+            df['ags'], df['id'].astype(str), df['municipality'], df['name'], df['url'],
+            df['timestamp'], df['scraped']
+            )
+        ]
+    with con:
+        con.execute('BEGIN IMMEDIATE')
+        con.executemany('''
+            INSERT OR IGNORE INTO restaurants
+                (ags, id, municipality, name, url, timestamp, scraped)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+        con.execute(
+            'UPDATE municipalities SET scraping_targets = ? WHERE ags = ?',
+            (relpath_targets, ags)
+            )
+
+def read_restaurants(con, ags):
+    # restaurant query log of a municipality as DataFrame
+    return pd.read_sql_query(
+        'SELECT ' + ', '.join(columns_restaurants)
+        + ' FROM restaurants WHERE ags = ? ORDER BY rowid',
+        con, params=(ags,)
+        ).fillna(value=np.nan)
+
+def claim_restaurant(con, ags, target_id, lease_seconds=900):
+    # claim target for this process, fails if scraped or validly claimed by another process
+    now = time.time()
+    with con:
+        cursor = con.execute('''
+            UPDATE restaurants SET claimed_by = ?, claimed_at = ?
+            WHERE ags = ? AND id = ? AND scraped IS NULL
+                AND (claimed_by IS NULL OR claimed_by = ? OR claimed_at < ?)
+            ''', (worker_name(), now, ags, str(target_id), worker_name(), now - lease_seconds))
+    return cursor.rowcount == 1
+
+def renew_claim(con, ags, target_id):
+    with con:
+        con.execute(
+            'UPDATE restaurants SET claimed_at = ? WHERE ags = ? AND id = ? AND claimed_by = ?',
+            (time.time(), ags, str(target_id), worker_name())
+            )
+
+def save_review_page(con, ags, target_id, language, page, reviews, last=False):
+    # reviews of a page (column -> values), last: no further pages for the language
+    # numpy scalars are converted to Python numbers, missings are stored as NaN
+    reviews_json = json.dumps(reviews, default=lambda value: value.item())
+    with con:
+        con.execute('''
+            INSERT OR REPLACE INTO review_pages (ags, id, language, page, reviews, last)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ''', (ags, str(target_id), language, page, reviews_json, int(last)))
+
+def read_review_pages(con, ags, target_id):
+    # checkpointed reviews of a restaurant per language: 
+    # language -> (last page scraped, language complete, column -> values)
+    languages = {}
+    for language, page, reviews, last in con.execute('''
+            SELECT language, page, reviews, last FROM review_pages
+            WHERE ags = ? AND id = ? ORDER BY language, page
+            ''', (ags, str(target_id))):
+        _, _, columns = languages.get(language, (0, False, {}))
+        for column, values in json.loads(reviews).items():
+            columns.setdefault(column, []).extend(values)
+        languages[language] = (page, bool(last), columns)
+    return languages
+
+def delete_review_pages(con, ags, target_id):
+    with con:
+        con.execute(
+            'DELETE FROM review_pages WHERE ags = ? AND id = ?', (ags, str(target_id))
+            )
+
+def complete_restaurant(con, ags, target_id, relpath_results):
+    # mark target as scraped (relpath_results) or release the claim (None) for a re-try
+    with con:
+        con.execute('''
+            UPDATE restaurants SET scraped = ?, claimed_by = NULL, claimed_at = NULL
+            WHERE ags = ? AND id = ?
+            ''', (relpath_results, ags, str(target_id)))
+
+def merge_store(con, path):
+    '''
+    Merge the checkpoint store of another node (sharded scraping) into this one: 
+    municipalities and restaurants are added, progress (scraping_targets, scraped) is 
+    taken over where the other node got further. Returns the number of rows merged.
+    '''
+    con.execute('ATTACH DATABASE ? AS node', (path,))
+    try:
+        with con:
+            con.execute('BEGIN IMMEDIATE')
+            municipalities = con.execute('''
+                INSERT INTO municipalities 
+                SELECT ags, municipality, state, postcodes, querystring, scraping_targets, scraped
+                FROM node.municipalities WHERE true
+                ON CONFLICT (ags) DO UPDATE SET
+                    scraping_targets = COALESCE(scraping_targets, excluded.scraping_targets),
+                    scraped = COALESCE(scraped, excluded.scraped)
+                ''').rowcount
+            restaurants = con.execute('''
+                INSERT INTO restaurants (ags, id, municipality, name, url, timestamp, scraped)
+                SELECT ags, id, municipality, name, url, timestamp, scraped 
+                FROM node.restaurants WHERE true
+                ON CONFLICT (ags, id) DO UPDATE SET
+                    scraped = COALESCE(scraped, excluded.scraped)
+                ''').rowcount
+    finally:
+        con.execute('DETACH DATABASE node')
+    return municipalities, restaurants
+
+def import_csv_logs(con, wd):
+    '''
+    Import the CSV query logs of earlier runs (tripadvisor_query_municipalities.csv and
+    the restaurant query logs referenced in its scraping_targets column).
+    '''
+    path_municipalities = wd + 'data/raw/tripadvisor_query_municipalities.csv'
+    if (os.path.exists(path_municipalities) == False):
+        return 0, 0
+    df_municipalities = pd.read_csv(path_municipalities, sep=';', dtype={'ags': object})
+    upsert_municipalities(con, df_municipalities)
+    restaurants = 0
+    for ags, relpath_targets, relpath_results in zip(
+            df_municipalities['ags'],
+            df_municipalities['scraping_targets'],
+            df_municipalities['scraped']
+            ):
+        if (pd.isnull(relpath_targets)):
+            continue
+        try:
+            df_restaurants = pd.read_csv(
+                wd + relpath_targets, sep=';', dtype={'ags': object, 'id': object}
+                )
+        except FileNotFoundError:
+            continue
+        add_restaurants(con, ags, df_restaurants, relpath_targets)
+        set_municipality(con, ags, 'scraped', relpath_results)
+        restaurants += len(df_restaurants)
+    return len(df_municipalities), restaurants
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file provides a small asyncio engine which overlaps blocking crawl steps.
+
+Steps (browser page loads, HTTP fetches, whole restaurants) stay blocking functions and 
+run in executors (threads or the browser pool), the event loop only schedules them: a 
+global semaphore bounds the number of steps running at once (max_steps; a step is as large 
+as the function it runs, e.g. a whole restaurant with all its pages and file writes), a 
+semaphore per host bounds the steps hitting the same host. The time between requests is 
+still left to the Throttle.
+
+'''
+
+# imports
+import time
+import asyncio
+from urllib.parse import urlparse
+
+##### CLASSES #####
+
+class CrawlEngine:
+
+    def __init__(self, max_steps=2, max_per_host=2):
+        self.max_steps = max_steps
+        self.max_per_host = max_per_host
+        # semaphores are created lazily, they have to belong to the running event loop
+        self.step_slots = None
+        self.hosts = {}
+        self.running = 0
+        self.peak = 0
+        self.steps = 0
+        self.seconds = 0.0
+
+    def host_semaphore(self, url):
+        host = urlparse(url).netloc
+        if (host not in self.hosts):
+            self.hosts[host] = asyncio.Semaphore(self.max_per_host)
+        return self.hosts[host]
+
+    async def run_step(self, executor, url, func, *args):
+        # run blocking step in executor as soon as a global and a per-host slot are free
+        if (self.step_slots is None):
+            self.step_slots = asyncio.Semaphore(self.max_steps)
+        async with self.step_slots:
+            async with self.host_semaphore(url):
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+                time_start = time.perf_counter()
+                try:
+                    return await asyncio.get_event_loop().run_in_executor(
+                        executor, func, *args
+                        )
+                finally:
+                    self.running -= 1
+                    self.steps += 1
+                    self.seconds += time.perf_counter() - time_start
+
+    def report(self):
+        return ('Crawl engine: %i steps, %.0f s step time, max. %i of %i at once (%i per host)'
+                % (self.steps, self.seconds, self.peak, self.max_steps, 
+                   self.max_per_host))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file serves the recorded pages in src/benchmark_fixtures as a local stand-in for
+Tripadvisor, so that the HTTP fetch path (TRIPADVISOR_FETCH=http) can be run without
+requests to Tripadvisor. Paths are mapped like Tripadvisor URLs:
+
+- /Restaurants, /Restaurants-g187323-oa30-Berlin.html: results_page.html
+- /Restaurant_Review-g187323-d9000000-Reviews-Restaurant_0-Berlin.html: restaurant.html
+- /MemberOverlay...: member_overlay.html
+- /blocked: block page (Access Denied), anything else: 404
+
+Start the server and point the scraper to it with TRIPADVISOR_BASE_URL:
+
+    python src/fixture_server.py [--port 8000]
+    export TRIPADVISOR_BASE_URL=http://127.0.0.1:8000
+
+'''
+
+# imports
+import os
+import argparse
+import threading
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+path_fixtures = str(Path(__file__).parent.absolute()) + '/benchmark_fixtures/'
+# fixture per path prefix (checked in order)
+routes = [
+    ('/Restaurant_Review-', 'restaurant.html'),
+    ('/Restaurants', 'results_page.html'),
+    ('/MemberOverlay', 'member_overlay.html'),
+    ]
+block_page = '<html><head><title>Access Denied</title></head><body></body></html>'
+
+##### FUNCTIONS #####
+
+def fixture_of(path):
+    # fixture file for a request path, None if there is none
+    for prefix, fixture in routes:
+        if (path.startswith(prefix)):
+            return fixture
+    return None
+
+def start_server(port=0, host='127.0.0.1'):
+    # serve in a daemon thread, returns server and base URL (port 0 = any free port)
+    server = ThreadingHTTPServer((host, port), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, name='fixture_server', daemon=True)
+    thread.start()
+    return server, 'http://%s:%i' % server.server_address[:2]
+
+##### CLASSES #####
+
+class FixtureHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        path = self.path.split('?')[0].split('#')[0]
+        fixture = fixture_of(path)
+        if (path == '/blocked'):
+            self.respond(200, block_page.encode('utf-8'))
+        elif ((fixture is None) or (os.path.exists(path_fixtures + fixture) == False)):
+            self.respond(404, b'Not found')
+        else:
+            with open(path_fixtures + fixture, 'rb') as f:
+                self.respond(200, f.read())
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # no request log on stderr
+        pass
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    parser = argparse.ArgumentParser(description='Serve recorded Tripadvisor pages locally.')
+    parser.add_argument('--port', type=int, default=8000)
+    args = parser.parse_args()
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), FixtureHandler)
+    print('Serving src/benchmark_fixtures on http://127.0.0.1:%i (Ctrl+C to stop)' % args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
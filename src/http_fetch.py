@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file provides a lightweight HTTP fetch path for server-rendered pages.
+
+A requests session keeps a pool of keep-alive connections per host and reuses its
+cookies (e.g. copied from the browser after accepting the cookie consent), so pages
+which need no JavaScript can be loaded without a browser. URLs are used as passed,
+which means a local stand-in server with recorded pages can be used instead of
+Tripadvisor (e.g. http://127.0.0.1:8000/Restaurants-g187323-Berlin.html).
+
+'''
+
+# imports
+import requests
+from requests.adapters import HTTPAdapter
+
+# same language preference as the Firefox options of the scraper
+headers = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:99.0) Gecko/20100101 Firefox/99.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'de-DE, de',
+    }
+
+##### FUNCTIONS #####
+
+def new_session(pool_size=4, retries=2):
+    # session with pooled keep-alive connections (one session per process)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(headers)
+    return session
+
+def copy_browser_cookies(session, cookies):
+    # reuse cookies of a WebDriver session (driver.get_cookies())
+    for cookie in cookies:
+        session.cookies.set(
+            cookie['name'], cookie['value'],
+            domain=cookie.get('domain'), path=cookie.get('path', '/')
+            )
+
+def fetch_html(session, url, timeout=30):
+    # GET page, raises requests.RequestException on connection errors and HTTP errors
+    response = session.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file collects timings of the scraper phases (page load, cookie accept, language
+switch, overlay, extraction, pagination, feather write, log write, README push).
+
+Each phase has a histogram of durations, each restaurant a record of the time spent per
+phase. Every process writes its own files (label/suffix = pid), so pool workers never
+write to the same file. Threads of a process (status reporter, HTTP fetch threads) share
+its Metrics, updates and snapshots are locked:
+
+- <name>_<pid>.prom: Prometheus textfile (node_exporter textfile collector)
+- <name>_<pid>.json: the same histograms as JSON
+- <name>_restaurants_<pid>.jsonl: one record per restaurant (rolled over at max_bytes)
+
+    with metrics.timer('page_load'):
+        driver.get(url)
+
+'''
+
+# imports
+import os
+import json
+import time
+import socket
+import threading
+from contextlib import contextmanager
+
+# histogram bucket bounds in seconds
+buckets = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600]
+
+##### CLASSES #####
+
+class Metrics:
+
+    def __init__(self, path_dir, name='scraper', max_bytes=10*1024*1024):
+        self.path_dir = path_dir
+        self.name = name
+        self.max_bytes = max_bytes # size of the restaurant records file before rollover
+        self.pid = os.getpid()
+        self.histograms = {} # phase -> bucket counts (last = +Inf), sum, count
+        self.counters = {}
+        self.restaurant = None # time per phase of the current restaurant
+        self.restaurant_start = None
+        self.lock = threading.Lock() # histograms, counters and restaurant record
+        self.lock_file = threading.Lock() # files are written by several threads
+        self.nested = threading.local() # time of running nested timers per thread
+
+    def observe(self, phase, seconds):
+        with self.lock:
+            if (phase not in self.histograms):
+                self.histograms[phase] = {
+                    'buckets': [0]*(len(buckets)+1), 'sum': 0.0, 'count': 0
+                    }
+            histogram = self.histograms[phase]
+            for i, bound in enumerate(buckets + [float('inf')]):
+                if (seconds <= bound):
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+            if (self.restaurant is not None):
+                self.restaurant[phase] = self.restaurant.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, phase):
+        # nested timers (e.g. overlay within extraction) are subtracted from the outer phase, 
+        # so that phases add up to the time spent
+        stack = self.nested.__dict__.setdefault('stack', [])
+        stack.append(0.0)
+        time_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - time_start
+            seconds_nested = stack.pop()
+            if (len(stack) > 0):
+                stack[-1] += seconds
+            self.observe(phase, seconds - seconds_nested)
+
+    def increment(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def start_restaurant(self):
+        with self.lock:
+            self.restaurant = {}
+            self.restaurant_start = time.perf_counter()
+
+    def end_restaurant(self, **labels):
+        # append record of the current restaurant, write histograms
+        with self.lock:
+            if (self.restaurant is None):
+                return
+            seconds = time.perf_counter() - self.restaurant_start
+            record = dict(labels, timestamp=time.time(), seconds=seconds, phases=self.restaurant)
+            self.restaurant = None
+        self.observe('restaurant', seconds)
+        os.makedirs(self.path_dir, exist_ok=True)
+        path_records = self.path('restaurants_' + str(self.pid), 'jsonl')
+        with self.lock_file:
+            if ((os.path.exists(path_records)) 
+                    and (os.path.getsize(path_records) > self.max_bytes)):
+                os.replace(path_records, path_records + '.1')
+            with open(path_records, 'a') as f:
+                f.write(json.dumps(record, default=str) + '\n')
+        self.flush()
+
+    def snapshot(self):
+        # copies of histograms and counters (other threads keep observing)
+        with self.lock:
+            histograms = {
+                phase: dict(histogram, buckets=list(histogram['buckets']))
+                for phase, histogram in self.histograms.items()
+                }
+            return histograms, dict(self.counters)
+
+    def path(self, suffix, extension):
+        return os.path.join(self.path_dir, self.name + '_' + suffix + '.' + extension)
+
+    def prometheus(self, histograms=None, counters=None):
+        if (histograms is None):
+            histograms, counters = self.snapshot()
+        labels = 'host="%s",process="%i"' % (socket.gethostname(), self.pid)
+        lines = [
+            '# HELP %s_phase_seconds Time spent per phase.' % self.name,
+            '# TYPE %s_phase_seconds histogram' % self.name,
+            ]
+        for phase, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(buckets + ['+Inf'], histogram['buckets']):
+                cumulative += count
+                lines.append('%s_phase_seconds_bucket{phase="%s",%s,le="%s"} %i'
+                             % (self.name, phase, labels, bound, cumulative))
+            lines.append('%s_phase_seconds_sum{phase="%s",%s} %f'
+                         % (self.name, phase, labels, histogram['sum']))
+            lines.append('%s_phase_seconds_count{phase="%s",%s} %i'
+                         % (self.name, phase, labels, histogram['count']))
+        for counter, value in sorted(counters.items()):
+            lines.append('# TYPE %s_%s_total counter' % (self.name, counter))
+            lines.append('%s_%s_total{%s} %s' % (self.name, counter, labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def flush(self):
+        # replace the textfiles atomically (collectors never read half-written files)
+        os.makedirs(self.path_dir, exist_ok=True)
+        histograms, counters = self.snapshot()
+        snapshot = {
+            'timestamp': time.time(),
+            'buckets': buckets,
+            'phases': histograms,
+            'counters': counters,
+            }
+        for extension, content in [
+                ('prom', self.prometheus(histograms, counters)), 
+                ('json', json.dumps(snapshot, indent=2))
+                ]:
+            path = self.path(str(self.pid), extension)
+            with self.lock_file:
+                with open(path + '.tmp', 'w') as f:
+                    f.write(content)
+                os.replace(path + '.tmp', path)
+
+    def report(self):
+        # total seconds per phase, largest first
+        histograms, _ = self.snapshot()
+        phases = sorted(
+            [(histogram['sum'], phase, histogram['count'])
+             for phase, histogram in histograms.items() if (phase != 'restaurant')],
+            reverse=True
+            )
+        return 'Phases: ' + ', '.join(
+            '%s %.1f s (%i)' % (phase, seconds, count) for seconds, phase, count in phases
+            )
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file provides the postcode→AGS index built from the OSM correspondence table
+(data/raw/zuordnung_plz_ort.csv).
+
+Postcodes are not unique to a municipality (one postcode area can span several
+municipalities and vice versa), so the index holds every (postcode, AGS) pair once, as a
+sorted int64 array of keys postcode * 10^8 + AGS (~100 kB for Germany). Lookups are
+binary searches, bulk checks of whole datasets are one vectorized searchsorted. The place
+names (ort) per AGS are kept to validate search results by the location in their links
+(place and state, see location_matches()). The index is cached in data/temp and rebuilt 
+when the CSV changes.
+
+Run this file to check the postcodes of all restaurants in the Parquet dataset:
+
+    python src/postcode_index.py
+
+'''
+
+# imports
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# version of the cached index (rebuilt on mismatch)
+index_version = 2
+# states as Tripadvisor writes them in links (English), by the first two digits of the AGS
+state_slugs = {
+    '01': 'schleswig_holstein', '02': 'hamburg', '03': 'lower_saxony', '04': 'bremen',
+    '05': 'north_rhine_westphalia', '06': 'hesse', '07': 'rhineland_palatinate',
+    '08': 'baden_wurttemberg', '09': 'bavaria', '10': 'saarland', '11': 'berlin',
+    '12': 'brandenburg', '13': 'mecklenburg_west_pomerania', '14': 'saxony',
+    '15': 'saxony_anhalt', '16': 'thuringia',
+    }
+# administrative regions Tripadvisor puts between place and state (Munich_Upper_Bavaria_Bavaria)
+region_slugs = [
+    'upper_bavaria', 'lower_bavaria', 'upper_palatinate', 'upper_franconia', 
+    'middle_franconia', 'lower_franconia', 'swabia'
+    ]
+
+##### FUNCTIONS #####
+
+def to_int(values, digits):
+    # postcodes/AGS as integers, -1 for missing or malformed values
+    values = pd.Series(values, dtype=object).astype(str).str.strip()
+    valid = values.str.fullmatch(r'\d{1,' + str(digits) + r'}')
+    return np.where(valid, pd.to_numeric(values.where(valid, '-1')), -1).astype(np.int64)
+
+def place_slug(name):
+    # comparable form of place names and location slugs (lower case, '_' separated), 
+    # umlauts as plain vowels like in Tripadvisor links (Düsseldorf -> dusseldorf)
+    name = unicodedata.normalize('NFKD', str(name).lower().replace('ß', 'ss'))
+    name = ''.join(char for char in name if (unicodedata.combining(char) == False))
+    return re.sub(r'[^a-z0-9]+', '_', name).strip('_')
+
+def slug_state(remainder):
+    # state of the part of a location slug after the place name: the state alone or 
+    # region and state (exact, Neustadt_an_der_Aisch_Bavaria is not Neustadt), None otherwise
+    for state in state_slugs.values():
+        if ((remainder == state) 
+                | any(remainder == region + '_' + state for region in region_slugs)):
+            return state
+    return None
+
+def location_slug(url):
+    # location of a restaurant link (.../Restaurant_Review-g1-d2-Reviews-Name-City_State.html)
+    return place_slug(url.split('#')[0].rsplit('-', 1)[-1].replace('.html', ''))
+
+def load_index(path_csv, path_cache):
+    # cached index if it is newer than the CSV, built (and cached) otherwise
+    if ((os.path.exists(path_cache))
+            and (os.path.getmtime(path_cache) >= os.path.getmtime(path_csv))):
+        with np.load(path_cache, allow_pickle=False) as cache:
+            if (('version' in cache.files) and (int(cache['version']) == index_version)):
+                return PostcodeIndex(cache['keys'], cache['place_ags'], cache['place_names'])
+    df = pd.read_csv(path_csv, usecols=['ort', 'plz', 'ags'], dtype=object).dropna()
+    postcodes = to_int(df['plz'], 5)
+    ags = to_int(df['ags'], 8)
+    valid = (postcodes >= 0) & (ags >= 0)
+    keys = np.unique(postcodes[valid] * PostcodeIndex.factor + ags[valid])
+    df_places = pd.DataFrame({'ags': ags, 'place': df['ort'].apply(place_slug).values})
+    df_places = df_places[valid].drop_duplicates().sort_values(['ags', 'place'])
+    index = PostcodeIndex(
+        keys, df_places['ags'].to_numpy(np.int64), 
+        np.array(df_places['place'].tolist(), dtype=str) # fixed-width, no pickling
+        )
+    os.makedirs(os.path.dirname(path_cache), exist_ok=True)
+    with open(path_cache, 'wb') as f:
+        np.savez_compressed(
+            f, keys=index.keys, place_ags=index.place_ags, place_names=index.place_names,
+            version=index_version
+            )
+    return index
+
+##### CLASSES #####
+
+class PostcodeIndex:
+
+    factor = 10**8 # keys: postcode * factor + AGS (AGS have 8 digits)
+
+    def __init__(self, keys, place_ags, place_names):
+        self.keys = keys # sorted unique (postcode, AGS) keys
+        self.place_ags = place_ags # sorted AGS of place_names
+        self.place_names = place_names
+        # municipalities per place name, overall and per state (same-named towns)
+        self.place_count = Counter(self.place_names)
+        self.place_state_count = Counter(zip(self.place_names, self.place_ags // 10**6))
+
+    def ags_of(self, postcode):
+        # all municipalities (AGS) sharing a postcode
+        postcode = to_int([postcode], 5)[0]
+        if (postcode < 0):
+            return []
+        start, end = np.searchsorted(
+            self.keys, [postcode * self.factor, (postcode+1) * self.factor]
+            )
+        return ['%08i' % (key % self.factor) for key in self.keys[start:end]]
+
+    def matches(self, postcodes, ags):
+        # bulk check: True where the postcode belongs to the municipality (AGS)
+        postcodes = to_int(postcodes, 5)
+        ags = to_int(ags, 8)
+        keys = postcodes * self.factor + ags
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys)-1)
+        return (self.keys[positions] == keys) & (postcodes >= 0) & (ags >= 0)
+
+    def places(self, ags):
+        # place names (slugs) of a municipality
+        ags = to_int([ags], 8)[0]
+        start, end = np.searchsorted(self.place_ags, [ags, ags+1])
+        return list(self.place_names[start:end])
+
+    def location_matches(self, url, ags):
+        # restaurant link located in one of the places of the municipality: a link with 
+        # state (Lichtenau_Saxony) has to name the state of the municipality and the place 
+        # has to be unique in the state, a link without state (Berlin) a place unique to 
+        # the municipality; False also means ambiguous (postcode check decides)
+        slug = location_slug(url)
+        state = to_int([ags], 8)[0] // 10**6
+        for place in self.places(ags):
+            if (slug == place):
+                if (self.place_count[place] == 1):
+                    return True
+            elif (slug.startswith(place + '_')):
+                if ((slug_state(slug[len(place)+1:]) == state_slugs.get('%02i' % state))
+                        & (self.place_state_count[(place, state)] == 1)):
+                    return True
+        return False
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    # bulk postcode check of all restaurants in the Parquet dataset
+    try:
+        wd = str(Path(__file__).parents[1].absolute()) + '/'
+    except NameError:
+        wd = str(Path().absolute()) + '/'
+    sys.path.append(wd + 'src')
+    import tripadvisor_dataset
+    index = load_index(wd + 'data/raw/zuordnung_plz_ort.csv', wd + 'data/temp/postcode_index.npz')
+    df = tripadvisor_dataset.open_parquet_dataset(
+        wd + 'data/processed/tripadvisor_reviews'
+        ).to_table(columns=['ags', 'id', 'name', 'postcode']).to_pandas()
+    df = df.drop_duplicates(['ags', 'id'])
+    # restaurants without postcode are counted separately (not as mismatches)
+    missing = df['postcode'].isnull()
+    df = df[~missing].astype(str)
+    df['postcode_match'] = index.matches(df['postcode'], df['ags'])
+    df_mismatches = df[df['postcode_match'] == False]
+    os.makedirs(wd + 'results/misc', exist_ok=True)
+    df_mismatches.to_csv(wd + 'results/misc/postcode_mismatches.csv', sep=';', index=False)
+    print('%i of %i restaurants with postcodes outside their municipality (%i without '
+          'postcode), saved: results/misc/postcode_mismatches.csv' 
+          % (len(df_mismatches), len(df) + int(missing.sum()), int(missing.sum())))
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file caches reviewer profiles (member overlay info) by review_user_id.
+
+Prolific reviewers appear in many restaurants, their member overlay only has to be opened
+once. Profiles are kept in an in-memory LRU per process and in a SQLite database (WAL
+mode) shared by all processes and runs. Profiles older than ttl_days count as stale and
+are fetched again. Hit/miss counters live in shared memory, so one ReviewerCache created
+in the main process can be passed to pool workers (initargs) and reports for the whole run.
+
+'''
+
+# imports
+import os
+import json
+import time
+import sqlite3
+import multiprocessing
+from collections import OrderedDict
+
+##### CLASSES #####
+
+class ReviewerCache:
+
+    def __init__(self, path, ttl_days=30, max_entries=50000):
+        self.path = path
+        self.ttl_seconds = ttl_days * 86400
+        self.max_entries = max_entries
+        self.memory = OrderedDict() # user_id -> (fetched_at, profile), least recent first
+        self.con = None # opened per process on first use
+        self.pid = None
+        self.lock = multiprocessing.Lock()
+        self.hits_memory = multiprocessing.Value('i', 0, lock=False)
+        self.hits_disk = multiprocessing.Value('i', 0, lock=False)
+        self.misses = multiprocessing.Value('i', 0, lock=False)
+        self.stale = multiprocessing.Value('i', 0, lock=False)
+
+    def __getstate__(self):
+        # connection and memory are per process (pickled for spawned workers)
+        state = self.__dict__.copy()
+        state['con'] = None
+        state['memory'] = OrderedDict()
+        return state
+
+    def connect(self):
+        # one connection per process (connections must not be shared after a fork)
+        if ((self.con is None) or (self.pid != os.getpid())):
+            self.con = sqlite3.connect(
+                self.path, timeout=60, isolation_level=None, check_same_thread=False
+                )
+            self.con.execute('PRAGMA journal_mode=WAL')
+            self.con.execute('PRAGMA synchronous=NORMAL')
+            self.con.execute('''
+                CREATE TABLE IF NOT EXISTS reviewers (
+                    user_id TEXT PRIMARY KEY,
+                    profile TEXT,
+                    fetched_at REAL
+                )''')
+            self.pid = os.getpid()
+        return self.con
+
+    def count(self, counter):
+        with self.lock:
+            counter.value += 1
+
+    def remember(self, user_id, fetched_at, profile):
+        self.memory[user_id] = (fetched_at, profile)
+        self.memory.move_to_end(user_id)
+        if (len(self.memory) > self.max_entries):
+            self.memory.popitem(last=False)
+
+    def get(self, user_id):
+        # profile (dict) if known and fresh, None otherwise (overlay has to be opened)
+        if (self.ttl_seconds <= 0):
+            return None
+        now = time.time()
+        if (user_id in self.memory):
+            fetched_at, profile = self.memory[user_id]
+            if (now - fetched_at < self.ttl_seconds):
+                self.memory.move_to_end(user_id)
+                self.count(self.hits_memory)
+                return profile
+            del self.memory[user_id]
+        row = self.connect().execute(
+            'SELECT profile, fetched_at FROM reviewers WHERE user_id = ?', (user_id,)
+            ).fetchone()
+        if (row is None):
+            self.count(self.misses)
+            return None
+        if (now - row[1] >= self.ttl_seconds):
+            self.count(self.stale)
+            return None
+        profile = json.loads(row[0])
+        self.remember(user_id, row[1], profile)
+        self.count(self.hits_disk)
+        return profile
+
+    def put(self, user_id, profile):
+        if (self.ttl_seconds <= 0):
+            return
+        now = time.time()
+        # numpy scalars are converted to Python numbers, missings are stored as NaN
+        profile_json = json.dumps(profile, default=lambda value: value.item())
+        with self.connect():
+            self.con.execute('''
+                INSERT INTO reviewers (user_id, profile, fetched_at) VALUES (?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    profile = excluded.profile, fetched_at = excluded.fetched_at
+                ''', (user_id, profile_json, now))
+        self.remember(user_id, now, json.loads(profile_json))
+
+    def report(self):
+        with self.lock:
+            hits = self.hits_memory.value + self.hits_disk.value
+            lookups = hits + self.misses.value + self.stale.value
+            return ('Reviewer cache: %i hits (%i from memory), %i misses, %i stale, '
+                    'hit rate %.0f %%'
+                    % (hits, self.hits_memory.value, self.misses.value, self.stale.value,
+                       100 * hits / lookups if (lookups > 0) else 0))
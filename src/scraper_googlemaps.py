@@ -32,7 +32,6 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.firefox.service import Service
-from webdriver_manager.firefox import GeckoDriverManager
 
 # working dir (Jupyter proof), add src to import search locations
 try:
@@ -41,12 +40,24 @@ except NameError:
     wd = str(Path().absolute()) + '/'
     print('You seem to be using a Jupyter environment. Make sure this points to the repository root: ' + wd)
 sys.path.append(wd + 'src')
+import browser
 
 # selenium options
 options = webdriver.FirefoxOptions()
 options.set_preference('intl.accept_languages', 'de-DE, de')
 #options.headless = True
 #options.binary_location = wd + 'env/Library/bin/firefox.exe' # activate when sharing code, does not work with group policy
+# lean profile with GOOGLEMAPS_PROFILE=lean (no images/media/fonts, ad/tracking domains 
+# blocked), Google's own analytics domains stay reachable
+if (os.environ.get('GOOGLEMAPS_PROFILE', 'full') == 'lean'):
+    options = browser.lean_options(
+        options, 
+        wd + 'data/temp/lean_blocklist_googlemaps.pac', 
+        blocklist=[
+            domain for domain in browser.blocked_domains 
+            if (domain not in ['googletagmanager.com', 'google-analytics.com'])
+            ]
+        )
 
 '''
 
@@ -61,7 +72,10 @@ x
 '''
 
 # start driver
-driver = webdriver.Firefox(service=Service(GeckoDriverManager().install()), options=options)
+driver = webdriver.Firefox(
+    service=Service(browser.geckodriver_path(wd + 'data/temp/geckodriver_path.txt')), 
+    options=options
+    )
 
 # options / functions
 driver.implicitly_wait(1)
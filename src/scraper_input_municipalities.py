@@ -2,8 +2,9 @@
 
 '''
 
-This file prepares a CSV file that contains municipality information 
-which will be fed as input to the scraper.
+This file prepares a Parquet file that contains municipality information 
+which will be fed as input to the scraper (postcodes as list<string>, state categorical, 
+see tripadvisor_dataset.read_input_municipalities()).
 
 '''
 
@@ -17,7 +18,8 @@ from ast import literal_eval
 import math
 import numpy as np
 import pandas as pd
-from time import sleep
+import pyarrow as pa
+from time import sleep, perf_counter
 from datetime import datetime
 
 from selenium import webdriver
@@ -41,18 +43,39 @@ except NameError:
           'Make sure this points to the repository root: ' 
           + wd)
 sys.path.append(wd + 'src')
+import tripadvisor_dataset
 
 ### gen municipality dataset from OSM contributor correspondence table
 '''
 We use the OSM correspondence table to map municipalities (identified via the Amtlicher 
 Gemeindeschlüssel) to names, postcodes, and federal states. We also generate a default query 
 string for Tripadvisor that is just name + state.
+Postcode lists are built columnar: rows sorted by municipality, one offset per group into 
+the postcode column (no Python list per municipality).
 '''
-df = pd.read_csv(wd + 'data/raw/zuordnung_plz_ort.csv', dtype={'ags': object, 'plz': object})
-df = df.groupby(['ags', 'ort', 'bundesland'])['plz'].unique().reset_index(name='plz')
-df['plz'] = df['plz'].apply(list) # convert nd.array to list
-df.columns = ['ags', 'municipality', 'state', 'postcodes']
-df['querystring'] = df['municipality'] + ' ' + df['state']
+time_start = perf_counter()
+df = pd.read_csv(
+    wd + 'data/raw/zuordnung_plz_ort.csv', 
+    usecols=['ags', 'ort', 'bundesland', 'plz'], 
+    dtype={'ags': object, 'plz': object}
+    )
 df = df[df['ags'].isin(['14523300', '16073077', '14523320', '13003000'])] # subset for now
-df.to_csv(wd + 'data/raw/tripadvisor_input_municipalities.csv', sep=';', index=False)
+# rows without municipality key are dropped (groupby would skip them, offsets would shift)
+df = df.dropna(subset=['ags', 'ort', 'bundesland'])
+df = df.drop_duplicates().sort_values(['ags', 'ort', 'bundesland', 'plz'])
+group_sizes = df.groupby(['ags', 'ort', 'bundesland'], sort=False).size()
+offsets = np.concatenate([[0], np.cumsum(group_sizes.values)]).astype(np.int32)
+municipalities = group_sizes.index.to_frame(index=False)
+table = pa.table({
+    'ags': municipalities['ags'].values,
+    'municipality': municipalities['ort'].values,
+    'state': pa.array(municipalities['bundesland'].values).dictionary_encode(),
+    'postcodes': pa.ListArray.from_arrays(offsets, pa.array(df['plz'].values, pa.string(), from_pandas=True)),
+    'querystring': (municipalities['ort'] + ' ' + municipalities['bundesland']).values,
+    })
+tripadvisor_dataset.write_input_municipalities(
+    table, wd + 'data/raw/tripadvisor_input_municipalities.parquet'
+    )
+print(str(len(table)) + ' municipalities saved to data/raw/tripadvisor_input_municipalities.parquet'
+      + ' (%.0f ms).' % (1000 * (perf_counter() - time_start)))
 
@@ -11,19 +11,31 @@ for restaurants in German municipalities.
 import os
 import sys
 import subprocess
+import socket
+import multiprocessing
+from multiprocessing.util import Finalize
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import re
 from pathlib import Path
+from urllib.parse import urljoin
 from ast import literal_eval
 import math
 import numpy as np
 import pandas as pd
-from pandas.api.types import union_categoricals
 import time
+import json
+from functools import partial
+from functools import wraps
 from datetime import datetime
 from datetime import timedelta
 import colorama
 from colorama import Fore
 from colorama import Style
+from bs4.element import Tag
+import requests
 
 from selenium import webdriver
 from selenium.webdriver.common.by import By
@@ -36,8 +48,6 @@ from selenium.common.exceptions import StaleElementReferenceException
 from selenium.common.exceptions import ElementNotInteractableException
 from selenium.common.exceptions import WebDriverException
 from selenium.common.exceptions import InvalidSessionIdException
-from selenium.webdriver.firefox.service import Service
-from webdriver_manager.firefox import GeckoDriverManager
 
 # working dir (Jupyter proof), add src to import search locations
 try:
@@ -48,6 +58,18 @@ except NameError:
           'Make sure this points to the repository root: ' 
           + wd)
 sys.path.append(wd + 'src')
+import tripadvisor_parser
+from throttle import Throttle
+import checkpoint_store
+import tripadvisor_dataset
+import http_fetch
+from crawl_engine import CrawlEngine
+import browser
+from reviewer_cache import ReviewerCache
+from metrics import Metrics
+from status_reporter import StatusReporter
+import sharding
+import postcode_index
 
 # selenium options
 options = webdriver.FirefoxOptions()
@@ -55,11 +77,127 @@ options.set_preference('intl.accept_languages', 'de-DE, de')
 options.headless = True
 #options.binary_location = wd + 'env/Library/bin/firefox.exe' # activate
 
+# scraper settings
+# number of browsers scraping restaurants in parallel (1 = sequential in main process)
+n_workers = int(os.environ.get('TRIPADVISOR_WORKERS', 1))
+# extraction of restaurant/review/user attributes:
+# 'webdriver' = WebDriver call per attribute, 'snapshot' = parse HTML once per page locally,
+# 'js' = one JavaScript call per page returning all reviews as JSON
+extraction_mode = os.environ.get('TRIPADVISOR_EXTRACTION', 'webdriver')
+# all page loads and clicks wait for the throttle (shared by all browsers): seconds between 
+# page loads, sped up while responses are healthy, backed off on timeouts and block pages
+throttle = Throttle(interval=3.0, min_interval=0.5, max_interval=120.0)
+# loading of server-rendered pages (results lists, postcode check):
+# 'browser' = Firefox, 'http' = pooled keep-alive HTTP session (browser only where JS is needed)
+fetch_backend = os.environ.get('TRIPADVISOR_FETCH', 'browser')
+session = http_fetch.new_session()
+# site all searches start from and relative links resolve against (e.g. a local server 
+# with recorded pages, python src/fixture_server.py)
+base_url = os.environ.get('TRIPADVISOR_BASE_URL', 'https://www.tripadvisor.de').rstrip('/')
+# scheduling of discovery and scraping: 'rounds' = one phase after the other (run_scheduler), 
+# 'async' = discovery of later municipalities overlaps scraping of earlier ones 
+# (run_async_engine), with at most max_steps steps (whole restaurants, discoveries of a 
+# municipality) at once, max_per_host per host (also HTTP page fetches at once)
+engine = os.environ.get('TRIPADVISOR_ENGINE', 'rounds')
+max_steps = int(os.environ.get('TRIPADVISOR_MAX_STEPS', n_workers + 1))
+max_per_host = int(os.environ.get('TRIPADVISOR_MAX_PER_HOST', max_steps))
+# pagination: 'url' = pages are loaded by offset (-oa30-/-or10-) up to the page count of the 
+# first page (page link clicked only if a page is not served), server-rendered results pages 
+# are fetched max_per_host at once (http backend), interrupted restaurants jump to their 
+# first page not checkpointed; 'click' = page links are clicked one after the other
+pagination = os.environ.get('TRIPADVISOR_PAGINATION', 'url')
+results_per_page = 30
+reviews_per_page = 10
+# browser profile: 'lean' = no images/media/fonts, ad and tracking domains blocked 
+# (blocklist file via TRIPADVISOR_BLOCKLIST, one domain per line), 'lean-nocss' = also no 
+# stylesheets, 'full' = everything is loaded
+browser_profile = os.environ.get('TRIPADVISOR_PROFILE', 'full')
+if (browser_profile in ['lean', 'lean-nocss']):
+    options = browser.lean_options(
+        options, 
+        wd + 'data/temp/lean_blocklist_tripadvisor.pac', 
+        blocklist=(
+            browser.read_blocklist(os.environ['TRIPADVISOR_BLOCKLIST']) 
+            if ('TRIPADVISOR_BLOCKLIST' in os.environ) 
+            else browser.blocked_domains + ['maps.googleapis.com', 'maps.gstatic.com']
+            ),
+        block_stylesheets=(browser_profile == 'lean-nocss')
+        )
+# browser startup: geckodriver path resolved once, browsers start on a copy of a warm profile
+# (cookie consent accepted); spare browser kept ready for restarts (a second Firefox per 
+# process): 'crash' = only after the first browser crash of a process, '1' = always, '0' = never
+path_geckodriver_cache = wd + 'data/temp/geckodriver_path.txt'
+path_profile_template = wd + 'data/temp/firefox_profile_tripadvisor'
+spare_browser = os.environ.get('TRIPADVISOR_SPARE_BROWSER', 'crash')
+browser_factory = None # created by start_driver() in each process
+# review languages: 'each' = page through every language filter separately, 'all' = one pass 
+# over the 'all languages' listing, language from markup or offline identification
+review_languages = os.environ.get('TRIPADVISOR_LANGUAGES', 'each')
+# incremental re-scrape of scraped restaurants (only reviews newer than the stored ones) 
+# instead of scraping new municipalities/restaurants
+refresh = (os.environ.get('TRIPADVISOR_REFRESH', '0') == '1')
+# scraping progress (source of truth, replaces the scraping_targets/scraped CSV columns)
+path_checkpoint_store = wd + 'data/raw/tripadvisor_checkpoints.sqlite'
+# multi-node scraping: TRIPADVISOR_SHARD=i/n (node i of n, deterministic by AGS) or 
+# TRIPADVISOR_LEASES=<directory on a shared filesystem> (municipalities are claimed 
+# dynamically in batches, leases of crashed nodes expire), each node keeps its own 
+# checkpoint store (merge with src/sharding.py)
+node = os.environ.get('TRIPADVISOR_NODE', socket.gethostname())
+node_shard = sharding.Shard(
+    node, 
+    *sharding.parse_shard(os.environ.get('TRIPADVISOR_SHARD', '0/1')),
+    path_leases=os.environ.get('TRIPADVISOR_LEASES'),
+    lease_seconds=int(os.environ.get('TRIPADVISOR_LEASE_SECONDS', 7200)),
+    batch=int(os.environ.get('TRIPADVISOR_LEASE_BATCH', 5))
+    )
+if ((node_shard.n_shards > 1) | (node_shard.path_leases is not None)):
+    path_checkpoint_store = wd + 'data/raw/tripadvisor_checkpoints_' + node + '.sqlite'
+# reviewer profiles (member overlay info) are cached by review_user_id, the overlay is only 
+# opened for unknown reviewers or profiles older than the TTL (0 = no cache)
+reviewer_cache = ReviewerCache(
+    wd + 'data/raw/tripadvisor_reviewer_cache.sqlite', 
+    ttl_days=float(os.environ.get('TRIPADVISOR_REVIEWER_TTL_DAYS', 30))
+    )
+
+# postcode→AGS index (OSM correspondence table), loaded on first use
+path_postcode_index = wd + 'data/temp/postcode_index.npz'
+postcode_ags = None
+
+# timings per phase and restaurant: histograms (Prometheus textfile and JSON) and restaurant 
+# records per process in data/temp/metrics
+path_metrics = wd + 'data/temp/metrics'
+metrics = Metrics(path_metrics, name='tripadvisor')
+
+# scraping status: written to data/temp/tripadvisor_status.json after every municipality,
+# pushed to the README (git) in the background at most every TRIPADVISOR_STATUS_MINUTES
+# (TRIPADVISOR_STATUS_PUSH=0: status file only)
+status_reporter = StatusReporter(
+    wd + 'data/temp/tripadvisor_status.json',
+    push=(lambda count, total: track_status_in_readme(count, total))
+        if (os.environ.get('TRIPADVISOR_STATUS_PUSH', '1') == '1') else None,
+    interval_minutes=float(os.environ.get('TRIPADVISOR_STATUS_MINUTES', 10)),
+    metrics=metrics
+    )
+
 # init colorama (enable colored terminal printing)
 colorama.init()
 
+# time spent waiting for elements that never appeared (reset per restaurant)
+# implicit waits are off, optional elements are probed without waiting
+missed_waits = {'count': 0, 'seconds': 0.0}
+
 ##### FUNCTIONS #####
 
+def timed(phase):
+    # decorator: time every call as phase (module-global metrics, replaced in pool workers)
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.timer(phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
 def run_shell_command(command=str, wd=wd):
     # allow for quoted strings
     substrings = command.split(' ',)
@@ -84,7 +222,8 @@ def run_shell_command(command=str, wd=wd):
     return result.returncode, result.stderr.decode("utf-8")
 
 def track_status_in_readme(count=int, total=int):
-    # pushes the current scraping status to the repo README
+    # pushes the current scraping status to the repo README (runs in the status reporter 
+    # thread, timed there), returns success and message
     # replaces '0/0 municipalities' scraped (municipalities unique to Tripadvisor)
     returncode = 0
     while (returncode==0):
@@ -96,52 +235,100 @@ def track_status_in_readme(count=int, total=int):
                 status_string = str(count) + '/' + str(total) + ' municipalities'
                 filedata = re.sub(r'[0-9]+/[0-9]+\smunicipalities', status_string, filedata)
         except IOError:
-            return 'README could not be opened.'
+            return False, 'README could not be opened.'
         try:
             with open(wd + 'README.md', 'w') as file:
                 file.write(filedata)
         except IOError:
-            return 'README could not be written.'
+            return False, 'README could not be written.'
         returncode, error = run_shell_command('git add README.md')
         returncode, error = run_shell_command('git commit -m "Automatic status update"')
         returncode, error = run_shell_command('git push origin main')
         break
     if (returncode != 0): 
-        return 'Scraping status could not be tracked. ' + error
+        return False, 'Scraping status could not be tracked. ' + error
     else:
-        return 'Scraping status successfully tracked.'
+        return True, 'Scraping status successfully tracked.'
 
-def concat_dfs_with_cat_data(dfs):
-    '''
-    Concatenate dataframe but keep categorical dtypes.
-    Credit: https://stackoverflow.com/a/57809778
-    '''
-    # Iterate on categorical columns common to all dfs
-    for col in set.intersection(
-            *[
-                set(df.select_dtypes(include='category').columns)
-                for df in dfs
-            ]
-            ):
-        # Generate the union category across dfs for this column
-        # exclude columns with only NaN, the float64 dtype differs from object
-        cols = [df[col] for df in dfs if df[col].isnull().all()==False]
-        if len(cols)>0:
-            uc = union_categoricals(cols)
-            # Change to union category for all dataframes
-            for df in dfs:
-                df[col] = pd.Categorical(df[col].values, categories=uc.categories)
-    return pd.concat(dfs, ignore_index=True)
+def record_missed_wait(time_start_wait):
+    # add time spent on an element that did not appear
+    missed_waits['count'] += 1
+    missed_waits['seconds'] += time.perf_counter() - time_start_wait
 
-def accept_cookies():
-    # accept cookies when prompted
+def reset_missed_waits():
+    missed_waits['count'] = 0
+    missed_waits['seconds'] = 0.0
+
+def missed_waits_report():
+    return ('%.1f s waited for %i missing elements' 
+            % (missed_waits['seconds'], missed_waits['count']))
+
+def find_optional(element, by, selector):
+    # zero-wait probe for optional elements, returns None if missing
+    time_start_wait = time.perf_counter()
+    elements = element.find_elements(by, selector)
+    if (len(elements) == 0):
+        record_missed_wait(time_start_wait)
+        return None
+    return elements[0]
+
+def wait_optional(condition, timeout=10):
+    # explicit wait for content loading asynchronously, returns None on timeout
+    time_start_wait = time.perf_counter()
     try:
-        cookie_prompt = wait.until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, '#onetrust-accept-btn-handler'))
-            )
-        driver.execute_script('arguments[0].click();', cookie_prompt)
+        return WebDriverWait(driver, timeout).until(condition)
     except TimeoutException:
-        pass
+        record_missed_wait(time_start_wait)
+        return None
+
+def is_block_page():
+    # Tripadvisor answers too many requests with a denial or captcha page
+    return (('Access Denied' in driver.title)
+            | (len(driver.find_elements(By.CSS_SELECTOR, 'iframe[src*="captcha-delivery"]')) > 0))
+
+@timed('page_load')
+def load_page(url):
+    # load page after waiting for the throttle, report health of the response
+    throttle.wait('page')
+    try:
+        driver.get(url)
+    except TimeoutException:
+        throttle.failure()
+        raise
+    if (is_block_page()):
+        throttle.failure()
+        raise TimeoutException('Block page returned for ' + url)
+    throttle.success()
+
+def is_block_html(html):
+    # same check as is_block_page() for pages loaded via HTTP
+    return (('<title>Access Denied' in html) | ('captcha-delivery' in html))
+
+@timed('page_load')
+def load_html(url):
+    # load server-rendered page via the HTTP session (throttled like load_page)
+    throttle.wait('page')
+    try:
+        html = http_fetch.fetch_html(session, url)
+    except requests.RequestException as e:
+        throttle.failure()
+        raise TimeoutException('HTTP request failed for ' + url + ': ' + str(e))
+    if (is_block_html(html)):
+        throttle.failure()
+        raise TimeoutException('Block page returned for ' + url)
+    throttle.success()
+    return html
+
+@timed('cookie_accept')
+def accept_cookies():
+    # accept cookies when prompted (never with the warm profile, consent cookie is set)
+    if (driver.get_cookie('OptanonAlertBoxClosed') is not None):
+        return
+    cookie_prompt = wait_optional(
+        EC.presence_of_element_located((By.CSS_SELECTOR, '#onetrust-accept-btn-handler'))
+        )
+    if (cookie_prompt is not None):
+        driver.execute_script('arguments[0].click();', cookie_prompt)
 
 def close_overlays(element):
     # in some cases triggered overlays do not close
@@ -166,30 +353,76 @@ def expand_teaser_text():
     # expand automatically trimmed text: 
     # find and click first occurence of 'mehr anzeigen',
     # applies to all elements on page
-    try:
-        driver.execute_script(
-            'arguments[0].click();', 
-            driver.find_element(
-                By.XPATH, 
-                './/p[contains(@class, "partial_entry")]/span[contains(@onclick,"clickExpand")]'
-                )
-            )
-    except NoSuchElementException:
-        pass
+    expand_link = find_optional(
+        driver, 
+        By.XPATH, 
+        './/p[contains(@class, "partial_entry")]/span[contains(@onclick,"clickExpand")]'
+        )
+    if (expand_link is not None):
+        driver.execute_script('arguments[0].click();', expand_link)
+        # full texts are loaded asynchronously, link is replaced when done
+        wait_optional(EC.staleness_of(expand_link), timeout=5)
 
+@timed('pagination')
 def switch_to_next_page(page=int):  
     # try to switch to next page, break if no possible
-    try:
-        pagelink = driver.find_element(
-            By.XPATH, 
-            './/div[contains(@class, "pageNumbers")]/a[contains(@data-page-number,"' 
-            + str(page+1) + '")]'
-            )
-        driver.execute_script('arguments[0].click();', pagelink)
-        time.sleep(1)
-        return True
-    except NoSuchElementException:
+    pagelink = find_optional(
+        driver, 
+        By.XPATH, 
+        './/div[contains(@class, "pageNumbers")]/a[contains(@data-page-number,"' 
+        + str(page+1) + '")]'
+        )
+    if (pagelink is None):
         return False
+    throttle.wait('click')
+    driver.execute_script('arguments[0].click();', pagelink)
+    # results/reviews (incl. page numbers) are replaced asynchronously
+    wait_optional(EC.staleness_of(pagelink))
+    return True
+
+def current_page():
+    # page number of the current results/reviews list (1 without pagination)
+    marker = find_optional(driver, By.CSS_SELECTOR, 'div[class*="pageNumbers"] .current')
+    if (marker is None):
+        return 1
+    return int(marker.get_attribute('data-page-number'))
+
+def page_count():
+    # number of pages of the current results/reviews list (1 without pagination)
+    numbers = [
+        link.get_attribute('data-page-number') for link in driver.find_elements(
+            By.CSS_SELECTOR, 'div[class*="pageNumbers"] [data-page-number]'
+            )
+        ]
+    return max([int(number) for number in numbers if (number.isdigit())] + [1])
+
+def jump_to_page(page, per_page, language_filter=None, url=None):
+    # load a page of a results/reviews list (url, default: current list) by its direct URL, 
+    # re-apply the review language filter (inputtype, langno; no click if the session kept 
+    # it), returns False if Tripadvisor did not serve the page (e.g. filter reset to page 1)
+    if (url is None):
+        url = driver.current_url
+    load_page(tripadvisor_parser.page_url(url, page, per_page))
+    if (language_filter is not None):
+        set_review_language(*language_filter)
+    return (current_page() == page)
+
+def next_page(url, page, per_page, pages_total, language_filter=None):
+    # switch from page to the next page of a results/reviews list (url of the list), 
+    # returns False when depleted; by direct URL up to pages_total (pagination 'url'),
+    # by clicking the page link with pagination 'click' or if the URL was not served
+    if (pagination == 'url'):
+        if (page >= pages_total):
+            return False
+        if (jump_to_page(page+1, per_page, language_filter, url=url)):
+            return True
+        driver.back() # page before, same session (filter kept)
+    return switch_to_next_page(page)
+
+def load_html_pages(urls):
+    # load server-rendered pages concurrently (max_per_host at once, each throttled)
+    with ThreadPoolExecutor(max_per_host) as executor:
+        return list(executor.map(load_html, urls))
 
 def search_for_municipality(query=str):
     # search for municipality, open first result of suggestions
@@ -201,7 +434,7 @@ def search_for_municipality(query=str):
     wait.until(
         EC.visibility_of_element_located((By.CSS_SELECTOR, 'input[value="' + query + '"]'))
         ) 
-    driver.get(
+    load_page(
         wait.until(
             lambda d: d.find_element(
                 By.CSS_SELECTOR, 'div#typeahead_results > a'
@@ -209,30 +442,60 @@ def search_for_municipality(query=str):
             )
         )
 
-def check_postcode_match(postcodes):
-    # check if postcode belongs to municipality
+def get_postcode_index():
+    global postcode_ags
+    if (postcode_ags is None):
+        postcode_ags = postcode_index.load_index(
+            wd + 'data/raw/zuordnung_plz_ort.csv', path_postcode_index
+            )
+    return postcode_ags
+
+def check_results_match(ags):
+    # check if first search result belongs to municipality: location in its link (listing 
+    # page), postcode on its restaurant page only if the location differs (e.g. restaurant 
+    # listed under a neighbouring town)
     first_result = wait.until(
         EC.visibility_of_element_located((By.XPATH, './/div[contains(@data-test,"1_list_item")]'))
         )
     link = first_result.find_element(
         By.XPATH, '(.//a[contains(@href,"Restaurant_Review")])[2]'
         ).get_attribute('href')
+    if (get_postcode_index().location_matches(link, ags)):
+        return True
+    return check_postcode_match(link, ags)
+
+def check_postcode_match(link, ags):
+    # check if postcode of restaurant belongs to municipality (shared postcodes included)
+    if (fetch_backend == 'http'):
+        # restaurant page is server-rendered, no need for a browser tab
+        postcode = fetch_data_attribute(
+            tripadvisor_parser.snapshot(load_html(link)), 'postcode', fallback=0
+            )
+        return bool(get_postcode_index().matches([postcode], [ags])[0])
     # open in new tab, check, switch back
     original_window = driver.current_window_handle
     driver.switch_to.new_window('tab')
-    driver.get(link)
+    load_page(link)
     postcode = driver.find_element(
                 By.XPATH, './/a[contains(@href,"#MAPVIEW")]'
                 ).text.split(', ', 1)
     postcode = re.sub(r'[^\d]+', '', postcode[1])
-    if (postcode in postcodes):
-        postcode_match = True
-    else:
-        postcode_match = False
+    postcode_match = bool(get_postcode_index().matches([postcode], [ags])[0])
     driver.close()
     driver.switch_to.window(original_window)
     return(postcode_match)
 
+def check_restaurant_postcodes(path_results_municipality, ags):
+    # bulk check of the restaurants of a municipality dataset: number of restaurants with 
+    # postcodes outside the municipality, number without postcode, number of restaurants
+    df = pd.read_feather(path_results_municipality, columns=['id', 'postcode'])
+    df = df.drop_duplicates('id')
+    missing = df['postcode'].isnull()
+    postcode_match = get_postcode_index().matches(
+        df.loc[~missing, 'postcode'].astype(str), [ags]*int((~missing).sum())
+        )
+    return int((postcode_match == False).sum()), int(missing.sum()), len(df)
+
 def get_restaurant_info_from_results_page(data_dict, municipality, ags, postcodes, scraped):
     continue_scrape = True
     # account for the possibility that there are no results at all 
@@ -271,6 +534,35 @@ def get_restaurant_info_from_results_page(data_dict, municipality, ags, postcode
                 break
     return continue_scrape
 
+def get_restaurant_info_from_results_snapshot(
+        data_dict, results_page, municipality, ags, scraped
+        ):
+    # same as get_restaurant_info_from_results_page() for a parsed results page
+    continue_scrape = True
+    items = tripadvisor_parser.results_page_items(results_page)
+    if (len(items) == 0):
+        continue_scrape = False
+        return continue_scrape
+    res_skipped = 0 # counter for restaurants with no reviews, breaks loop if 3 in a row
+    for item in items:
+        if (item is None):
+            res_skipped = res_skipped + 1
+            if (res_skipped > 2):
+                continue_scrape = False 
+                break
+            continue
+        name, link = item
+        link = urljoin(base_url + '/', link)
+        data_dict['name'].append(name)
+        data_dict['url'].append(link)
+        data_dict['timestamp'].append(datetime.now().strftime('%Y-%m-%d, %H:%M:%S'))
+        data_dict['municipality'].append(municipality)
+        data_dict['ags'].append(ags)
+        id_string = link.split('-', 3)
+        data_dict['id'].append(id_string[1] + id_string[2])
+        data_dict['scraped'].append(scraped)
+    return continue_scrape
+
 def file_suffix_from_municipality_name(municipality_string):
     # replaces German umlaute, strips spaces and /, returns lowercase string
     umlaute_dict = {
@@ -290,16 +582,18 @@ def file_suffix_from_municipality_name(municipality_string):
 def get_review_languages():
     try:
         # fetch review languages from language picker overlay
-        languagepicker = driver.find_element(
-            By.XPATH, './/div[span[contains(text(),"Weitere Sprachen")]]'
+        languagepicker = find_optional(
+            driver, By.XPATH, './/div[span[contains(text(),"Weitere Sprachen")]]'
             )
+        if (languagepicker is None):
+            raise NoSuchElementException('Weitere Sprachen')
         driver.execute_script('arguments[0].click();', languagepicker)
-        languages = driver.find_elements(
-            By.CSS_SELECTOR, 'div.ui_overlay.prw_filters_detail_language div.item'
-            )
+        languages = wait.until(EC.presence_of_all_elements_located(
+            (By.CSS_SELECTOR, 'div.ui_overlay.prw_filters_detail_language div.item')
+            )) # overlay content is loaded asynchronously
         inputtype = 'overlay'
         close_overlays(driver)
-        time.sleep(0.5)
+        throttle.wait('overlay')
     except NoSuchElementException:
         # if no language dropdown, use list of radio buttons
         languages = driver.find_elements(
@@ -310,6 +604,7 @@ def get_review_languages():
         lang_count = len(languages)
         return(inputtype, lang_count)
 
+@timed('language_switch')
 def set_review_language(inputtype, langno):
     close_overlays(driver)      
     if (inputtype == 'overlay'):
@@ -318,9 +613,9 @@ def set_review_language(inputtype, langno):
             By.XPATH, './/div[span[contains(text(),"Weitere Sprachen")]]'
             )
         driver.execute_script('arguments[0].click();', languagepicker)
-        languages = driver.find_elements(
-            By.CSS_SELECTOR, 'div.ui_overlay.prw_filters_detail_language div.item'
-            )
+        languages = wait.until(EC.presence_of_all_elements_located(
+            (By.CSS_SELECTOR, 'div.ui_overlay.prw_filters_detail_language div.item')
+            )) # overlay content is loaded asynchronously
     elif (inputtype == 'radio'):
         languages = driver.find_elements(
             By.CSS_SELECTOR, 'div#REVIEWS div.prw_filters_detail_language div.choices div.item'
@@ -332,15 +627,166 @@ def set_review_language(inputtype, langno):
             ).get_attribute('checked') == 'true'):
         close_overlays(driver)
     else:
+        first_review = find_optional(
+            driver, By.CSS_SELECTOR, 'div.listContainer div.review-container'
+            )
+        throttle.wait('click')
         driver.execute_script(
             'arguments[0].click();', languages[langno].find_element(By.CSS_SELECTOR, 'input')
             )
-    time.sleep(1)
+        # reviews are replaced asynchronously for the selected language
+        if (first_review is not None):
+            wait_optional(EC.staleness_of(first_review))
     return(language)
 
+# JavaScript extractors (extraction_mode 'js'): collect raw strings in the browser with one
+# call, converted to attribute values in tripadvisor_parser.js_*_record()
+# innerText corresponds to WebElement.text
+JS_EXTRACT_REVIEWS = '''
+    function text(el) { return el ? el.innerText.replace(/\\s+/g, ' ').trim() : null; }
+    function attr(el, name) { return el ? el.getAttribute(name) : null; }
+    var reviews = [];
+    document.querySelectorAll('div.listContainer div.review-container').forEach(function (rev) {
+        var memberReviews = null;
+        rev.querySelectorAll('div[class*="member_info"] > span').forEach(function (span) {
+            if (memberReviews === null && span.textContent.indexOf('Bewertung') > -1) {
+                memberReviews = text(span);
+            }
+        });
+        reviews.push({
+            review_id: attr(rev, 'data-reviewid'),
+            user_element_id: attr(rev.querySelector('div.memberOverlayLink.clickable'), 'id'),
+            date: attr(rev.querySelector('span.ratingDate'), 'title'),
+            rating_class: attr(rev.querySelector('span.ui_bubble_rating'), 'class'),
+            title: text(rev.querySelector('div.quote a span.noQuotes')),
+            text: text(rev.querySelector('div.entry p.partial_entry')),
+            member_name: text(rev.querySelector('div[class*="member_info"] div.info_text > div')),
+            member_reviews: memberReviews,
+            lang: attr(rev.querySelector('div.entry [lang], div.quote [lang]'), 'lang'),
+            translated: rev.querySelector('div.prw_reviews_mt_header_hsx') !== null
+        });
+    });
+    return JSON.stringify(reviews);
+    '''
+JS_EXTRACT_MEMBER_OVERLAY = '''
+    function text(el) { return el ? el.innerText.replace(/\\s+/g, ' ').trim() : null; }
+    var overlay = arguments[0];
+    function ownText(selector, string) {
+        var found = null;
+        overlay.querySelectorAll(selector).forEach(function (el) {
+            var own = Array.prototype.filter.call(el.childNodes, function (n) {
+                return n.nodeType === Node.TEXT_NODE;
+            });
+            if (found === null && own.length > 0 && own[0].textContent.indexOf(string) > -1) {
+                found = text(el);
+            }
+        });
+        return found;
+    }
+    var description = overlay.querySelectorAll(
+        'ul[class*="memberdescriptionReviewEnhancements"] > li'
+        );
+    var counts = 'li[class*="countsReviewEnhancementsItem"] > span';
+    return JSON.stringify({
+        username: text(overlay.querySelector('h3.username')),
+        description: description.length > 1 ? text(description[1]) : null,
+        signup: ownText('li', 'Tripadvisor-Mitglied seit'),
+        reviews: ownText(counts, 'Beitr'),
+        thumbsup: ownText(counts, 'Hilfreich'),
+        visited: ownText(counts, 'besuchte')
+    });
+    '''
+
+@timed('extraction')
+def fetch_reviews_js():
+    # all reviews on page as records keyed by attribute names (one WebDriver call)
+    raw_reviews = json.loads(driver.execute_script(JS_EXTRACT_REVIEWS))
+    return [tripadvisor_parser.js_review_record(raw) for raw in raw_reviews]
+
+def fetch_member_overlay_js(overlay):
+    # user attributes of the visible member overlay (one WebDriver call)
+    return tripadvisor_parser.js_overlay_record(
+        json.loads(driver.execute_script(JS_EXTRACT_MEMBER_OVERLAY, overlay))
+        )
+
+@timed('overlay')
+def fetch_user_overlay(rev, attributes_user_overlay):
+    # open member overlay of a review, returns reviewer profile (dict of overlay attributes)
+    close_overlays(driver)
+    # allow DOM to adjust, otherwise 1st row per lang empty: previous overlay closed and 
+    # overlay link of the review clickable (the throttle only limits the request rate)
+    overlay_link = rev.find_element(By.CSS_SELECTOR, 'div.memberOverlayLink.clickable')
+    wait.until(EC.invisibility_of_element_located(
+        (By.CSS_SELECTOR, 'span.ui_popover div.memberOverlay')
+        ))
+    wait.until(EC.element_to_be_clickable(overlay_link))
+    throttle.wait('overlay')
+    driver.execute_script('arguments[0].click();', overlay_link)
+    wait.until(EC.visibility_of_element_located(
+        (By.CSS_SELECTOR, 'span.ui_popover div.memberOverlay h3.username')
+        )) # wait until overlay content visible
+    overlay = driver.find_element(
+        By.CSS_SELECTOR, 'span.ui_popover div.memberOverlay'
+        )
+    if (extraction_mode == 'snapshot'):
+        overlay = page_snapshot(overlay)
+    elif (extraction_mode == 'js'):
+        overlay = fetch_member_overlay_js(overlay)
+    profile = {
+        attr: fetch_data_attribute(element=overlay, attr=attr, fallback=0) 
+        for attr in attributes_user_overlay
+        }
+    close_overlays(driver)
+    return profile
+
+def is_translated_review(rev_data):
+    # translated reviews are marked by a header (WebElement, snapshot or JavaScript record)
+    if (isinstance(rev_data, dict)):
+        return rev_data['translated']
+    return has_element(rev_data, 'div.prw_reviews_mt_header_hsx')
+
+def review_language(rev_data):
+    '''
+    Language of a review in the 'all languages' listing: lang attribute of review text or
+    title in the markup, otherwise identified offline from title and text. Machine-translated
+    reviews without markup are 'und' (undetermined), their visible text is a translation.
+    '''
+    language = fetch_data_attribute(element=rev_data, attr='review_language_markup', fallback=0)
+    if (pd.isnull(language) == False):
+        return language
+    if (is_translated_review(rev_data)):
+        return 'und'
+    language = tripadvisor_parser.identify_language(' '.join(
+        str(fetch_data_attribute(element=rev_data, attr=attr, fallback=0)) 
+        for attr in ['review_title', 'review_text']
+        ))
+    return ('und' if pd.isnull(language) else language)
+
+@timed('extraction')
+def page_snapshot(element=None):
+    # get HTML of page (or element) in one call, parse locally for all attributes
+    if (element is None):
+        return tripadvisor_parser.snapshot(driver.page_source)
+    return tripadvisor_parser.snapshot(element.get_attribute('outerHTML'))
+
+def has_element(element, css_selector):
+    # check if element contains css_selector, works on snapshots and WebElements
+    if (isinstance(element, Tag)):
+        return tripadvisor_parser.has_element(element, css_selector)
+    return find_optional(element, By.CSS_SELECTOR, css_selector) is not None
+
 def fetch_data_attribute(element, attr, fallback):
     # fetch attributes in try/except setting
     # pass element (container which is searched) and attribute fetching/processing rules
+    # snapshots (extraction_mode 'snapshot') are parsed locally without WebDriver calls
+    # records of the JavaScript extractor (extraction_mode 'js') hold the values already
+    if (isinstance(element, Tag)):
+        return tripadvisor_parser.parse_data_attribute(element, attr, fallback)
+    elif (isinstance(element, dict)):
+        if (attr == 'review_user_overlay_failed'):
+            return fallback
+        return element.get(attr, np.nan)
+    time_start_wait = time.perf_counter()
     try:
         # fetch passed attribute
         if (attr == 'name'):
@@ -388,9 +834,9 @@ def fetch_data_attribute(element, attr, fallback):
             if (fallback==0):
                 value = element.find_element(By.CSS_SELECTOR, 'h3.username').text
             else:
+                # same selector as the snapshot/JavaScript extraction
                 value = element.find_element(
-                    By.XPATH, 
-                    './/div[contains(@class, "member_info")]/div[@class, "info_text")]/div'
+                    By.CSS_SELECTOR, 'div[class*="member_info"] div.info_text > div'
                     ).text
         elif (attr == 'review_user_gender'):
             if (fallback==0):
@@ -427,7 +873,7 @@ def fetch_data_attribute(element, attr, fallback):
                     value = value[0].split(' aus ', 1)
                     value = value[1]
                 elif ('Aus' in value[0]):
-                    value = value[0].text.split('').replace('Aus ','')
+                    value = value[0].replace('Aus ', '')
                 else:
                     value = np.nan
             else:
@@ -501,91 +947,119 @@ def fetch_data_attribute(element, attr, fallback):
             value = element.find_element(By.CSS_SELECTOR, 'div.entry p.partial_entry').text
         elif (attr == 'review_id'):
             value = element.get_attribute('data-reviewid')
+        elif (attr == 'review_language_markup'):
+            value = tripadvisor_parser.language_code(element.find_element(
+                By.CSS_SELECTOR, 'div.entry [lang], div.quote [lang]'
+                ).get_attribute('lang'))
     except Exception:
+        record_missed_wait(time_start_wait)
         value = np.nan
     finally:
         return(value)  
 
-def init_scraper(driver, wait):
+@timed('log_write')
+def set_municipality_status(df_query_municipalities, ags, column, value):
+    # keep the in-memory municipality query log and the checkpoint store in sync
+    df_query_municipalities[column].mask(
+        df_query_municipalities['ags'] == ags, value, inplace=True
+        )
+    checkpoint_store.set_municipality(store, ags, column, value)
+
+def read_input_municipalities():
+    # typed Parquet input (scraper_input_municipalities.py), CSV input of earlier versions
+    path_input = wd + 'data/raw/tripadvisor_input_municipalities'
+    if (os.path.exists(path_input + '.parquet')):
+        return tripadvisor_dataset.read_input_municipalities(path_input + '.parquet')
+    return pd.read_csv(
+        path_input + '.csv',
+        sep=";",
+        converters={'postcodes': literal_eval},
+        dtype={'ags': object}
+        )
+
+def reconcile_municipalities(df_query_municipalities, df_input_municipalities):
+    '''
+    Reconciles the municipality query log with the user input in one vectorized pass 
+    (keyed on ags, the first input row per ags counts):
+    - added: input municipalities not in the query log (anti-join), default query string 
+      municipality + state if none is provided
+    - changed: user provided query string differs from the logged one
+    - postcode flag: missing input query string (postcode check failed), logged one is reset
+
+    Returns the updated query log and the number of added/changed/flagged municipalities.
+    '''
+    df_input_municipalities = df_input_municipalities.drop_duplicates('ags')
+    columns = ['ags', 'municipality', 'state', 'postcodes', 'querystring', 
+               'scraping_targets', 'scraped']
+
+    # query strings of known municipalities (left join keeps order and progress columns)
+    df_reconciled = df_query_municipalities[['ags', 'querystring']].merge(
+        df_input_municipalities[['ags', 'querystring']], 
+        on='ags', how='left', suffixes=('', '_input'), indicator=True
+        )
+    in_input = (df_reconciled['_merge'] == 'both').values
+    querystring_input = df_reconciled['querystring_input'].values
+    querystring_logged = df_reconciled['querystring'].values
+    changed_user = (in_input & pd.notnull(querystring_input) 
+                    & (querystring_input != querystring_logged))
+    changed_postcode_flag = (in_input & pd.isnull(querystring_input) 
+                             & pd.notnull(querystring_logged))
+    df_query_municipalities = df_query_municipalities.copy()
+    df_query_municipalities['querystring'] = np.where(
+        changed_user | changed_postcode_flag, querystring_input, querystring_logged
+        )
+
+    # new municipalities (anti-join on ags)
+    df_added = df_input_municipalities[
+        ~df_input_municipalities['ags'].isin(df_query_municipalities['ags'])
+        ].copy()
+    df_added['querystring'] = df_added['querystring'].fillna(
+        df_added['municipality'] + ' ' + df_added['state'].astype(str)
+        )
+    df_added['scraping_targets'] = np.nan
+    df_added['scraped'] = np.nan
+    if (len(df_added) > 0):
+        df_query_municipalities = pd.concat(
+            [df_query_municipalities, df_added[columns]], ignore_index=True
+            )
+
+    return (df_query_municipalities, len(df_added), int(changed_user.sum()), 
+            int(changed_postcode_flag.sum()))
+
+def init_scraper():
     '''
     Checks for the current scraping status and initializes the scraper for the information we miss.
-    Keep tabs in the municipality query log (tripadvisor_query_municipalities.csv) and the 
-    restaurant query log for each municipality (tripadvisor_query_restaurants_MUNICIPALITY.csv).
+    Keep tabs in the checkpoint store (tripadvisor_checkpoints.sqlite) which holds the 
+    municipality query log and the restaurant query log for each municipality (CSV query logs 
+    of earlier runs are imported once).
 
     (1) Check if municipality list has changed in user input.
-    (2) Check if restaurant scraping targets have been collected for each municipality.
-    (3) Check if restaurant info and reviews have been scraped for each municipality/restaurant.
+
+    Returns the municipality query log, which run_scheduler() keeps in memory.
     '''
     print('')
     print('Checking Tripadvisor scraping status:')
     print('-------------------------------------')
 
-    # initiate municipality query log
-    try:
-        df_query_municipalities = pd.read_csv(
-            wd + 'data/raw/tripadvisor_query_municipalities.csv',
-            sep=";",
-            dtype={'ags': object}
-            )
-    except FileNotFoundError:
-        df_query_municipalities = pd.DataFrame(
-            columns=['ags', 'municipality', 'state', 'postcodes', 'querystring', 
-                     'scraping_targets', 'scraped']
+    # initiate municipality query log (import CSV query logs into an empty store)
+    if (checkpoint_store.is_empty(store)):
+        municipalities_imported, restaurants_imported = checkpoint_store.import_csv_logs(
+            store, wd
             )
+        if (municipalities_imported > 0):
+            print(str(municipalities_imported) + ' municipalities and ' 
+                  + str(restaurants_imported) + ' restaurants imported from CSV query logs.')
+    df_query_municipalities = checkpoint_store.read_municipalities(store)
     
     # (1) update municipality list from user input
     # We ensure uniqueness via the ags code (Amtlicher Gemeindeschlüssel)
-    df_input_municipalities = pd.read_csv(
-        wd + 'data/raw/tripadvisor_input_municipalities.csv',
-        sep=";",
-        converters={'postcodes': literal_eval},
-        dtype={'ags': object}
-        )
-    municipalities_added = 0
-    querystrings_changed_user = 0
-    querystrings_changed_postcode_flag = 0
-    for municipality, ags, postcodes, state, querystring in zip(
-            df_input_municipalities['municipality'],
-            df_input_municipalities['ags'],
-            df_input_municipalities['postcodes'],
-            df_input_municipalities['state'],
-            df_input_municipalities['querystring']
-            ):
-        # add new municipalities
-        if (ags not in df_query_municipalities['ags'].values):
-            municipalities_added = municipalities_added + 1
-            if (pd.isnull(querystring)):
-                querystring = municipality + ' ' + state # default query string
-            df_query_municipalities_row = pd.DataFrame(
-                [[ags, municipality, state, postcodes, querystring, np.nan, np.nan]], 
-                columns=['ags', 'municipality', 'state', 'postcodes', 'querystring', 
-                           'scraping_targets', 'scraped']
-                )
-            df_query_municipalities = pd.concat(
-                [df_query_municipalities, df_query_municipalities_row], 
-                ignore_index=True
-                )
-        # change default querystring value to user provided string (querystring is unique)
-        # querystring is np.nan if postcode check returned false in get_scraping_targets()
-        if ((querystring not in df_query_municipalities['querystring'].values)
-                & (~pd.isnull(querystring))):
-            querystrings_changed_user = querystrings_changed_user + 1
-            df_query_municipalities['querystring'].mask(
-                    df_query_municipalities['ags'] == ags, 
-                    querystring, 
-                    inplace=True
-                    )
-        elif (pd.isnull(querystring)):
-            querystrings_changed_postcode_flag = querystrings_changed_postcode_flag + 1
-            df_query_municipalities['querystring'].mask(
-                df_query_municipalities['ags'] == ags, 
-                querystring, 
-                inplace=True
-                )
-    # replace query log file and print status
-    df_query_municipalities.to_csv(
-        wd + 'data/raw/tripadvisor_query_municipalities.csv', sep=";", index=False
-        )
+    df_input_municipalities = read_input_municipalities()
+    df_query_municipalities, municipalities_added, querystrings_changed_user, \
+        querystrings_changed_postcode_flag = reconcile_municipalities(
+            df_query_municipalities, df_input_municipalities
+            )
+    # update query log and print status
+    checkpoint_store.upsert_municipalities(store, df_query_municipalities)
     if ((municipalities_added > 0) 
             | (querystrings_changed_user > 0) 
             | (querystrings_changed_postcode_flag > 0)):
@@ -596,44 +1070,81 @@ def init_scraper(driver, wait):
     else:
         print('Municipality query list up to date.')
 
-    # (2) Get list of municipalities for which we have a querystring but no scraping targets yet
-    municipalities_to_be_scraped = df_query_municipalities[
-        (df_query_municipalities['scraping_targets'].isin([np.nan]))
-        & (~df_query_municipalities['querystring'].isin([np.nan]))
-        ][['municipality', 'ags', 'postcodes', 'querystring']]
-    if (len(municipalities_to_be_scraped) > 0):
-        print('Scraping target list missing for ' + str(len(municipalities_to_be_scraped)) 
-              + ' municipalities.')
-        get_scraping_targets(
-            df_input_municipalities, 
-            df_query_municipalities, 
-            municipalities_to_be_scraped
-            )
-    else:
-        print('Scraping target list available for each municipality.')
- 
-    # (3) Get list of municipalities with no/incomplete scraping of restaurant info/reviews
-    municipalities_to_be_scraped = df_query_municipalities[
-        (~df_query_municipalities['scraping_targets'].isin([np.nan]))
-        & df_query_municipalities['scraped'].isin([np.nan])
-        ][['municipality', 'ags', 'scraping_targets']]
-    if (len(municipalities_to_be_scraped) > 0):
-        print('Restaurant info/reviews missing for ' + str(len(municipalities_to_be_scraped)) 
-              + ' municipalities.')
-        scrape_target_info(
-            df_query_municipalities, 
-            municipalities_to_be_scraped
-            )
-    else:
-        print('Information has been scraped for all municipalities and restaurants.')
-        print('Total running duration: ' 
-                 + str(timedelta(seconds=time.perf_counter()-time_start)))
-        sys.exit('Exiting...')
+    return df_query_municipalities
 
+def run_scheduler(df_query_municipalities):
+    '''
+    Moves the municipalities through the scraping phases in rounds (iteratively, the stack 
+    depth stays constant and the query log is kept in memory between phases):
 
-def get_scraping_targets(
-        df_input_municipalities, df_query_municipalities, municipalities_to_be_scraped
-        ):
+    (2) Discovery: collect restaurant scraping targets for municipalities with a querystring.
+    (3) Scraping/merge: scrape restaurant info and reviews for each municipality/restaurant, 
+        merge the municipality dataset as soon as all its restaurants are scraped.
+
+    Returns True when everything is scraped, False if rounds stopped bringing progress 
+    (e.g. restaurants which are never saved due to failed consistency checks).
+    '''
+    rounds_without_progress = 0
+    while (rounds_without_progress < 3):
+        progress_before = scheduler_progress(df_query_municipalities)
+        claimed = claimed_municipalities(df_query_municipalities)
+
+        # (2) Get list of municipalities with a querystring but no scraping targets yet
+        municipalities_to_be_discovered = df_query_municipalities[
+            (df_query_municipalities['scraping_targets'].isin([np.nan]))
+            & (~df_query_municipalities['querystring'].isin([np.nan]))
+            & claimed
+            ][['municipality', 'ags', 'postcodes', 'querystring']]
+        if (len(municipalities_to_be_discovered) > 0):
+            print('Scraping target list missing for ' 
+                  + str(len(municipalities_to_be_discovered)) + ' municipalities.')
+            get_scraping_targets(df_query_municipalities, municipalities_to_be_discovered)
+        else:
+            print('Scraping target list available for each municipality.')
+
+        # (3) Get list of municipalities with no/incomplete scraping of restaurant info/reviews
+        municipalities_to_be_scraped = df_query_municipalities[
+            (~df_query_municipalities['scraping_targets'].isin([np.nan]))
+            & df_query_municipalities['scraped'].isin([np.nan])
+            & claimed
+            ][['municipality', 'ags', 'scraping_targets']]
+        if (len(municipalities_to_be_scraped) > 0):
+            print('Restaurant info/reviews missing for ' + str(len(municipalities_to_be_scraped)) 
+                  + ' municipalities.')
+            scrape_target_info(df_query_municipalities, municipalities_to_be_scraped)
+        elif (len(municipalities_to_be_discovered) == 0):
+            print('Information has been scraped for all municipalities and restaurants.')
+            return True
+
+        # next round only for what is left
+        if (scheduler_progress(df_query_municipalities) == progress_before):
+            # lease mode: leave them to other nodes and claim others (no round counted)
+            if (node_shard.release_held() == 0):
+                rounds_without_progress += 1
+        else:
+            rounds_without_progress = 0
+    print(Fore.YELLOW + 'No progress in the last 3 rounds, remaining municipalities/restaurants '
+          + 'need to be checked manually.' + Style.RESET_ALL)
+    return False
+
+def claimed_municipalities(df_query_municipalities):
+    # mask of the municipalities this node works on (all of them without sharding), 
+    # municipalities without querystring and targets (failed results check) are not claimed
+    ags_open = df_query_municipalities.loc[
+        df_query_municipalities['scraped'].isin([np.nan])
+        & ~(df_query_municipalities['querystring'].isin([np.nan])
+            & df_query_municipalities['scraping_targets'].isin([np.nan])), 
+        'ags'
+        ]
+    return df_query_municipalities['ags'].isin(node_shard.claim(list(ags_open)))
+
+def scheduler_progress(df_query_municipalities):
+    # municipalities with targets, scraped municipalities, scraped restaurants
+    return (df_query_municipalities['scraping_targets'].notnull().sum(), 
+            df_query_municipalities['scraped'].notnull().sum(), 
+            checkpoint_store.count_scraped_restaurants(store))
+
+def get_scraping_targets(df_query_municipalities, municipalities_to_be_scraped):
     '''
     Fetch all restaurants per municipality, save:
     - municipality
@@ -668,25 +1179,32 @@ def get_scraping_targets(
             ):
 
         # get restaurant page and search for municipality
-        driver.get('https://www.tripadvisor.de/Restaurants')
+        load_page(base_url + '/Restaurants')
         accept_cookies()
+        if (fetch_backend == 'http'):
+            # share consent and session cookies with the HTTP session
+            http_fetch.copy_browser_cookies(session, driver.get_cookies())
         search_for_municipality(querystring)
 
-        # opt-out geo search radius broadening
-        try:
-            driver.find_element(By.CSS_SELECTOR, 'div#geobroaden_opt_out').click()
-            time.sleep(3)
-        except (NoSuchElementException, ElementNotInteractableException):
-            pass
+        # opt-out geo search radius broadening (shown with the results, probe afterwards)
+        first_item = wait_optional(EC.visibility_of_element_located(
+            (By.XPATH, './/div[contains(@data-test,"1_list_item")]')
+            ))
+        geobroaden_opt_out = find_optional(driver, By.CSS_SELECTOR, 'div#geobroaden_opt_out')
+        if (geobroaden_opt_out is not None):
+            try:
+                throttle.wait('page') # reloads results
+                geobroaden_opt_out.click()
+                # results are replaced, never read the list from before the reload
+                if (first_item is not None):
+                    wait_optional(EC.staleness_of(first_item))
+            except ElementNotInteractableException:
+                pass
 
-        # check if postcode of first search result corresponds to the searched-for municipality
+        # check if first search result belongs to the searched-for municipality
         # if not: set to missing in log (requires manual determination of search strings)
-        if (check_postcode_match(postcodes) == False):
-            df_input_municipalities['querystring'].mask(
-                df_query_municipalities['ags'] == ags, 
-                np.nan, 
-                inplace=True
-                )
+        if (check_results_match(ags) == False):
+            set_municipality_status(df_query_municipalities, ags, 'querystring', np.nan)
             print(Fore.YELLOW + ags + ' ' + municipality 
                   + ': Skipped. Query did not return results with matching postcodes. '
                   + 'Please provide correct querystring manually.' + Style.RESET_ALL)
@@ -697,17 +1215,51 @@ def get_scraping_targets(
             del value[:]
 
         # loop over pages of restaurant search results (assume max. 1000 pages with 30 results)
-        for page in range(1,1000):
-            # fetch and save result info from page
-            results = get_restaurant_info_from_results_page(
-                data_dict=data, municipality=municipality, ags=ags, postcodes=postcodes, 
-                scraped=np.nan
-                )
-            if (results == True):
-                # switch to next page until depleted
-                if (switch_to_next_page(page) is False): break
-            else:
-                break
+        if (fetch_backend == 'http'):
+            # result pages are server-rendered: first page from the browser (search results),
+            # following pages via HTTP
+            url = driver.current_url
+            results_pages = [page_snapshot()]
+            pages_total = tripadvisor_parser.page_count(results_pages[0])
+            for page in range(1,1000):
+                results_page = results_pages.pop(0)
+                results = get_restaurant_info_from_results_snapshot(
+                    data_dict=data, results_page=results_page, municipality=municipality, 
+                    ags=ags, scraped=np.nan
+                    )
+                if (results == False): break
+                if (pagination == 'click'):
+                    next_link = tripadvisor_parser.next_page_link(results_page, page)
+                    if (next_link is None): break
+                    url = urljoin(url, next_link)
+                    results_pages.append(tripadvisor_parser.snapshot(load_html(url)))
+                elif (len(results_pages) == 0):
+                    # next pages by direct URL (page count of the first page), fetched 
+                    # concurrently in batches (results stop early if restaurants lack reviews)
+                    if (page >= pages_total): break
+                    urls = [
+                        tripadvisor_parser.page_url(url, next_page, results_per_page)
+                        for next_page in range(
+                            page+1, min(page+max_per_host, pages_total)+1
+                            )
+                        ]
+                    results_pages = [
+                        tripadvisor_parser.snapshot(html) for html in load_html_pages(urls)
+                        ]
+        else:
+            url = driver.current_url
+            pages_total = page_count()
+            for page in range(1,1000):
+                # fetch and save result info from page
+                results = get_restaurant_info_from_results_page(
+                    data_dict=data, municipality=municipality, ags=ags, postcodes=postcodes, 
+                    scraped=np.nan
+                    )
+                if (results == True):
+                    # switch to next page until depleted
+                    if (next_page(url, page, results_per_page, pages_total) is False): break
+                else:
+                    break
         
         # create dataframe
         # drop potential duplicates due to sponsored results
@@ -721,37 +1273,36 @@ def get_scraping_targets(
                 'data/raw/tripadvisor_query_restaurants_' 
                 + file_suffix_from_municipality_name(municipality) + '_' + ags + '.csv'
                 )
-            df.to_csv(wd + relpath, sep = ";", index=False)
-            print(Fore.GREEN + ags + ' ' + municipality + ': ' + str(len(df)) 
-                + ' restaurants saved in scraping target list.' + Style.RESET_ALL)
-            # add path to status file
+            with metrics.timer('log_write'):
+                df.to_csv(wd + relpath, sep = ";", index=False)
+                # add targets and path to checkpoint store (one transaction)
+                checkpoint_store.add_restaurants(store, ags, df, relpath)
             df_query_municipalities['scraping_targets'].mask(
-                df_query_municipalities['ags'] == ags, 
-                relpath, 
-                inplace=True,
-                )
-            df_query_municipalities.to_csv(
-                wd + 'data/raw/tripadvisor_query_municipalities.csv', sep=";", index=False
+                df_query_municipalities['ags'] == ags, relpath, inplace=True
                 )
+            print(Fore.GREEN + ags + ' ' + municipality + ': ' + str(len(df)) 
+                + ' restaurants saved in scraping target list.' + Style.RESET_ALL)
         else:
             print(Fore.YELLOW + ' ' + municipality + ': No scraping list saved due to ' 
                 + str(missings) + ' missings / ' + str(len(df)) + ' rows in dataframe.'
                 + Style.RESET_ALL)
             break
 
-    # re-init scraper after completion (will continue with target info when all targets scraped)
-    init_scraper(driver, wait)
+    print(throttle.report())
+    metrics.flush()
 
-def scrape_target_info(df_query_municipalities, municipalities_to_be_scraped):
+def scrape_restaurant(target, df_stored=None):
     '''
-    municipality-by-municipality:
-    - Scrape restaurant info and reviews for each target (keep track)
-    - Save dataset for each target
-    - Merge datasets for all targets and save municipality dataset (keep track)
+    Scrape restaurant info and reviews for a single target and save the restaurant dataset.
+    Runs in the main process (n_workers = 1) or in a worker process of the browser pool, 
+    each worker using its own driver. Returns the target identifiers, the relative path of 
+    the saved dataset (None if not saved) and a status message for the log.
+    Incremental (df_stored = reviews scraped before): reviews are listed newest first, so 
+    each language is only paged until its newest stored review, new reviews are appended.
+    Reviews are checkpointed per language and page (checkpoint store), an interrupted 
+    restaurant resumes after its last checkpointed page. Checks run over all pages.
     '''
-    print('')
-    print('Scraping restaurant info/reviews:')
-    print('---------------------------------')
+    municipality, ags, target_id, target_name, target_link = target
 
     # data structure
     data = {
@@ -799,309 +1350,782 @@ def scrape_target_info(df_query_municipalities, municipalities_to_be_scraped):
         'review_user_id', 'review_date', 'review_score', 'review_title', 'review_text', 
         'review_language', 'review_id', 'timestamp'
         ]
+    attributes_page = attributes_user_overlay + attributes_review # checkpointed per page
 
-    ### loop over municipalities
-    for c, (municipality, ags, relpath_query_restaurants) in enumerate(zip(
-                municipalities_to_be_scraped['municipality'], 
-                municipalities_to_be_scraped['ags'],
-                municipalities_to_be_scraped['scraping_targets']
-                ),
-            start=1):
-
-        print(ags + ' ' + municipality)
+    reset_missed_waits()
+    load_page(target_link + '#REVIEWS') # throttled, pause should avoid being blocked
+    accept_cookies()
 
-        # get restaurant links from target list file per municipality (check if already scraped)
-        df_query_restaurants = pd.read_csv(wd + relpath_query_restaurants, sep=";")
-        targets = df_query_restaurants[
-            df_query_restaurants['scraped'].isin([np.nan])
-            ]
+    # get restaurant data
+    if (extraction_mode == 'snapshot'):
+        page = page_snapshot()
+    else:
+        page = driver
+    with metrics.timer('extraction'):
+        for attr in attributes_restaurant:
+            if (attr == 'municipality'):
+                data[attr].append(municipality)
+            elif (attr == 'ags'):
+                data[attr].append(ags)
+            elif (attr == 'id'):
+                data[attr].append(target_id)
+            elif (attr == 'name'):
+                data[attr].append(target_name)
+            elif (attr == 'url'):
+                data[attr].append(target_link)
+            else:
+                data[attr].append(fetch_data_attribute(element=page, attr=attr, fallback=0))
 
-        ### loop over restaurants
-        for target_id, target_name, target_link in zip(
-                targets['id'], targets['name'], targets['url']
-                ):
-        
-            time.sleep(3) # pause should avoid being blocked
-            driver.get(target_link + '#REVIEWS')
-            accept_cookies()
-            
-            # start clean
-            for value in data.values():
-                del value[:]
-
-            # get restaurant data
-            for attr in attributes_restaurant:
-                if (attr == 'municipality'):
-                    data[attr].append(municipality)
-                elif (attr == 'ags'):
-                    data[attr].append(ags)
-                elif (attr == 'id'):
-                    data[attr].append(target_id)
-                elif (attr == 'name'):
-                    data[attr].append(target_name)
-                elif (attr == 'url'):
-                    data[attr].append(target_link)
-                else:
-                    data[attr].append(fetch_data_attribute(element=driver, attr=attr, fallback=0))
-
-            ### get reviews and review related info
-            rev_count = 0
-            # review language selection
-            inputtype, lang_count = get_review_languages()
-            for l in range(1, lang_count):
-                language = set_review_language(inputtype=inputtype, langno=l)
-                selected_review_language_end = False # make sure only untranslated reviews count
-                # extract review info per language (loop over pages)
-                for page in range(1,1000):
-                    expand_teaser_text()
-                    # fetch all reviews on page
-                    rev_list = driver.find_elements(
-                        By.CSS_SELECTOR, 'div.listContainer div.review-container'
+    ### get reviews and review related info
+    rev_count = 0
+    known_review_ids = {}
+    review_pages = {} # checkpointed pages per language (full scrapes)
+    if (df_stored is not None):
+        known_review_ids = df_stored.groupby('review_language')['review_id'].apply(
+            lambda review_ids: set(review_ids.astype(str))
+            ).to_dict()
+    else:
+        review_pages = checkpoint_store.read_review_pages(store, ags, target_id)
+    # review language selection (first filter item is 'all languages')
+    inputtype, lang_count = get_review_languages()
+    if (review_languages == 'all'):
+        language_numbers = [0]
+        # newest stored review of any language ends the single pass
+        known_review_ids = {'all': set().union(*known_review_ids.values())}
+    else:
+        language_numbers = range(1, lang_count)
+    for l in language_numbers:
+        if (review_languages == 'all'):
+            if (lang_count > 0):
+                set_review_language(inputtype=inputtype, langno=l)
+            language = 'all'
+        else:
+            language = set_review_language(inputtype=inputtype, langno=l)
+        selected_review_language_end = False # make sure only untranslated reviews count
+        known_review_reached = False # incremental: older reviews are stored already
+        # reviews of checkpointed pages, skip to the first page not checkpointed
+        pages_done, language_complete, reviews_done = review_pages.get(language, (0, False, {}))
+        for attr, values in reviews_done.items():
+            data[attr].extend(values)
+        rev_count = rev_count + len(reviews_done.get('review_id', []))
+        if (language_complete is True):
+            continue
+        page_start = pages_done + 1
+        skip_from = 1 # checkpointed pages are skipped by clicks from here
+        # first page of the language: list URL and page count for direct page URLs
+        url = driver.current_url
+        pages_total = page_count()
+        language_filter = (inputtype, l) if (lang_count > 0) else None
+        if ((page_start > 1) & (pagination == 'url')):
+            if (jump_to_page(page_start, reviews_per_page, language_filter) == True):
+                skip_from = page_start
+            else:
+                jump_to_page(1, reviews_per_page, language_filter)
+        for page in range(skip_from, page_start):
+            if (switch_to_next_page(page) is False):
+                page_start = None # fewer pages than checkpointed, language is complete
+                break
+        if (page_start is None):
+            continue
+        # extract review info per language (loop over pages)
+        for page in range(page_start, 1000):
+            checkpoint_store.renew_claim(store, ags, target_id) # still working on it
+            rev_index_page = len(data['review_id']) # first review of the page
+            expand_teaser_text()
+            # fetch all reviews on page
+            rev_list = driver.find_elements(
+                By.CSS_SELECTOR, 'div.listContainer div.review-container'
+                )
+            # review info is read from rev_data: the WebElement itself, its snapshot
+            # (snapshot of the whole list in one call) or its JavaScript record (all reviews
+            # in one call), WebElement is kept for clicks
+            rev_data_list = rev_list
+            if ((extraction_mode == 'snapshot') & (len(rev_list) > 0)):
+                rev_data_list = tripadvisor_parser.review_containers(page_snapshot(
+                    driver.find_element(By.CSS_SELECTOR, 'div.listContainer')
+                    ))
+            elif ((extraction_mode == 'js') & (len(rev_list) > 0)):
+                rev_data_list = fetch_reviews_js()
+            # extraction of the page timed once (overlays are timed as their own phase)
+            with metrics.timer('extraction'):
+                for rev, rev_data in zip(rev_list, rev_data_list):
+                    # scroll into view
+                    driver.execute_script('arguments[0].scrollIntoView();', rev)
+                    # break loop when translated reviews start (only fetch original language)
+                    # only applies for german (quirk on Tripadvisor page)
+                    if ((language == 'de') & (review_languages == 'each')):
+                        if (is_translated_review(rev_data)):
+                            selected_review_language_end = True
+                            break
+                    review_id = fetch_data_attribute(element=rev_data, attr='review_id', fallback=0)
+                    if (str(review_id) in known_review_ids.get(language, set())):
+                        known_review_reached = True
+                        break
+                    # count
+                    rev_count = rev_count + 1
+                    # fetch
+                    review_user_id = fetch_data_attribute(
+                        element=rev_data, attr='review_user_id', fallback=0
                         )
-                    for rev in rev_list:
-                        # scroll into view
-                        driver.execute_script('arguments[0].scrollIntoView();', rev)
-                        # break loop when translated reviews start (only fetch original language)
-                        # only applies for german (quirk on Tripadvisor page)
-                        if (language == 'de'):
-                            try:
-                                rev.find_element(By.CSS_SELECTOR, 'div.prw_reviews_mt_header_hsx')
-                                selected_review_language_end = True
-                                break
-                            except NoSuchElementException:
-                                pass
-                        # count
-                        rev_count = rev_count + 1
-                        # fetch
-                        try:
-                            # try to get user info overlay
-                            close_overlays(driver)
-                            time.sleep(0.5) # allow DOM to adjust, otherwise 1st row per lang empty
-                            driver.execute_script(
-                                'arguments[0].click();', 
-                                rev.find_element(By.CSS_SELECTOR, 'div.memberOverlayLink.clickable')
-                                )
-                            wait.until(EC.visibility_of_element_located(
-                                (By.CSS_SELECTOR, 'span.ui_popover div.memberOverlay h3.username')
-                                )) # wait until overlay content visible
-                            overlay = driver.find_element(
-                                By.CSS_SELECTOR, 'span.ui_popover div.memberOverlay'
-                                )
-                            for attr in attributes_user_overlay:
+                    time_start_wait = time.perf_counter()
+                    try:
+                        # known reviewer: profile from cache, otherwise try to get user info overlay
+                        profile = None
+                        if (pd.isnull(review_user_id) == False):
+                            profile = reviewer_cache.get(review_user_id)
+                        if (profile is None):
+                            profile = fetch_user_overlay(rev, attributes_user_overlay)
+                            if (pd.isnull(review_user_id) == False):
+                                reviewer_cache.put(review_user_id, profile)
+                        for attr in attributes_user_overlay:
+                            data[attr].append(profile[attr])
+                    except (NoSuchElementException, TimeoutException):
+                        # if user overlay fails, get user info set already visible
+                        # can fail due to missing user info (e.g. deleted acc) or timeout
+                        record_missed_wait(time_start_wait)
+                        for attr in attributes_user_overlay:
+                            data[attr].append(fetch_data_attribute(
+                                element=rev_data, attr=attr, fallback=1
+                                ))
+                    finally:
+                        # get review info
+                        for attr in attributes_review:
+                            if ((attr == 'review_language') & (language == 'all')):
+                                data[attr].append(review_language(rev_data))
+                            elif (attr == 'review_language'):
+                                data[attr].append(language)
+                            elif (attr == 'review_user_id'):
+                                data[attr].append(review_user_id)
+                            elif (attr == 'review_id'):
+                                data[attr].append(review_id)
+                            elif (attr == 'timestamp'):
+                                data[attr].append(datetime.now().strftime('%Y-%m-%d, %H:%M:%S'))
+                            else:
                                 data[attr].append(fetch_data_attribute(
-                                    element=overlay, attr=attr, fallback=0
+                                    element=rev_data, attr=attr, fallback=0
                                     ))
-                            close_overlays(driver) 
-                        except (NoSuchElementException, TimeoutException):
-                            # if user overlay fails, get user info set already visible
-                            # can fail due to missing user info (e.g. deleted acc) or timeout
-                            for attr in attributes_user_overlay:
-                                data[attr].append(fetch_data_attribute(
-                                    element=rev, attr=attr, fallback=1
-                                    ))
-                        finally:
-                            # get review info
-                            for attr in attributes_review:
-                                if (attr == 'review_language'):
-                                    data[attr].append(language)
-                                elif (attr == 'timestamp'):
-                                    data[attr].append(datetime.now().strftime('%Y-%m-%d, %H:%M:%S'))
-                                else:
-                                    data[attr].append(fetch_data_attribute(
-                                        element=rev, attr=attr, fallback=0
-                                        ))
-                            # print status
+                        # print status (only when scraping sequentially, lines would interleave)
+                        if (n_workers == 1):
                             sys.stdout.write(
                                 '\r ├─ %s: Review languages %i, total reviews scraped %i' 
                                 % (target_name, l, rev_count)
                                 )
                             sys.stdout.flush()
-                    # switch to next language when scraper arrives at translated review block
-                    if (selected_review_language_end is True): break
-                    # switch to next page until depleted
-                    if (switch_to_next_page(page) is False): break
-                # language loop close
-            # create dataframe per restaurant
-            for attr in attributes_restaurant: 
-                data[attr] = data[attr]*rev_count # expand fixed restaurant info
-            df = pd.DataFrame.from_dict(data)
-            
-            ### save dataframe per restaurant after some basic checks, keep log
-            # Drop duplicates: last resort technique to prevent that translated reviews
-            # appear twice (usually the check in the review loop works, but not always). 
-            df.drop_duplicates(subset=['review_id'], keep='last', inplace=True)
-            missings = df.isnull().sum().sum()
-            rev_count_site = int(re.sub(r'[^\d]+', '', 
-                driver.find_element(By.CSS_SELECTOR, 'span.reviews_header_count').text
-                ))
-            if (len(df)==0):
-                print('\n │  └─ ' + Fore.YELLOW + 'Dataframe not saved: Length is 0' 
-                      + Style.RESET_ALL)
-                continue                
-            elif (len(df) < rev_count_site):
-                # A scraped review count lower than the review count on page usually happens
-                # when reviews do not load properly. There might also be a slight chance that 
-                # new reviews get added while we scrape, but this is uncheckable in the process. 
-                # A new scraping iteration should fix both.
-                # A higher review count does not matter as long as there are no duplicates (which
-                # is fixed above). Also: The Tripadvisor count is sometimes 1 too large. 
-                print('\n │  └─ ' + Fore.YELLOW 
-                        + 'Dataframe not saved: Length (after dropping potential duplicates) is ' 
-                        + 'smaller than page review count ('+ str(len(df)) + ' vs. ' 
-                        + str(rev_count_site) + ')' + Style.RESET_ALL
-                    )
-                continue
-            elif (missings > (0.5*len(df)*len(df.columns))):
-                print('\n │  └─ ' + Fore.YELLOW + 'Dataframe not saved: >50 % ('
-                      + str(missings) + '/' + str(len(df)*len(df.columns)) + ') missing.'
-                      + Style.RESET_ALL
+            # checkpoint page (last page of the language at the translated review block)
+            language_end = (selected_review_language_end is True)
+            if (df_stored is None):
+                reviews_page = {attr: data[attr][rev_index_page:] for attr in attributes_page}
+                checkpoint_store.save_review_page(
+                    store, ags, target_id, language, page, reviews_page, last=language_end
                     )
-                continue
-            else:
-                # Use categorical dtypes wherever possible
-                columns_categorical = [
-                    'id', 'name', 'url', 'street_w_no', 'postcode', 'municipality', 'ags', 
-                    'cuisine1', 'cuisine2', 'cuisine3', 'review_user_name', 'review_user_gender', 
-                    'review_user_age', 'review_user_municipality', 'review_user_country', 
-                    'review_user_id', 'review_language'
-                ]
-                for col in columns_categorical:
-                    df[col] = df[col].astype('category')
-                # save under temp (will be deleted after dataset is complete for municipality)
-                # data can be feather instead of CSV
-                relpath_results_restaurants = (
-                    'data/temp/tripadvisor_results_restaurant_' 
-                    + file_suffix_from_municipality_name(municipality)
-                    + '_' + ags + '_'+ target_id + '.feather'
-                    )
-                df.reset_index().to_feather(wd + relpath_results_restaurants)
-                print('\n │  └─ ' + Fore.GREEN + 'Dataframe saved: ' 
-                        + relpath_results_restaurants + Style.RESET_ALL)
-                # add path to restaurant query file
-                df_query_restaurants['scraped'].mask(
-                    df_query_restaurants['id'] == target_id, 
-                    relpath_results_restaurants, 
-                    inplace=True
-                    )
-                df_query_restaurants.to_csv(wd + relpath_query_restaurants, sep=";", index=False)
-
-        ### combine restaurant datasets per municipality and save ONLY when everything is complete
-        if (df_query_restaurants['scraped'].isnull().sum()==0):
-
-            # append
-            for r, relpath_results_restaurants in enumerate(df_query_restaurants['scraped']):
-                df_restaurant = pd.read_feather(wd + relpath_results_restaurants)
-                if (r==0):
-                    df_results_municipality = df_restaurant
-                else:
-                    df_results_municipality = concat_dfs_with_cat_data(
-                        [df_results_municipality, df_restaurant]
+            # switch to next language when scraper arrives at translated review block
+            # or at the stored reviews
+            if ((language_end is True) | (known_review_reached is True)): break
+            # switch to next page until depleted
+            if (next_page(url, page, reviews_per_page, pages_total, language_filter) is False):
+                if (df_stored is None):
+                    checkpoint_store.save_review_page(
+                        store, ags, target_id, language, page, reviews_page, last=True
                         )
-            
-            # save feather and delete delete restaurant result spreadsheets when successful
-            try:
-                relpath_results_municipality = (
-                    'data/raw/tripdavisor_results_' 
-                    + file_suffix_from_municipality_name(municipality)
-                    + '_' + ags + '.feather'
-                    )
-                df_results_municipality.reset_index().drop(
-                    columns=['level_0', 'index']
-                    ).to_feather(wd + relpath_results_municipality)
-                save_success = True
-                print(' ├─ ' + Fore.GREEN + 'Merged dataset saved: ' 
-                      + relpath_results_municipality + Style.RESET_ALL)
-            except Exception:
-                save_success = False
-                print(' └─ ' + Fore.RED + 'Merged dataset for ' + municipality 
-                      + ' could not be saved.' + Style.RESET_ALL)
-            if (save_success == True):
-                # delete temp files (if any)
-                # for relpath_results_restaurants in df_query_restaurants['scraped']:
-                #     try:
-                #         os.remove(wd + relpath_results_restaurants)
-                #     except FileNotFoundError:
-                #         pass
-                # replace status in log files with link to feather file
-                df_query_municipalities['scraped'].mask(
-                    df_query_municipalities['ags'] == ags, 
-                    relpath_results_municipality, 
-                    inplace=True
-                    )
-                df_query_municipalities.to_csv(
-                    wd + 'data/raw/tripadvisor_query_municipalities.csv', sep=";", index=False
-                    )
-                # update status in README
-                print(' └─ ' + Fore.GREEN 
-                      + track_status_in_readme(
-                          df_query_municipalities['scraped'].notnull().sum(), 
-                          len(df_query_municipalities)
-                          )
-                      + Style.RESET_ALL)
-        else:
-            print(' └─ ' + Fore.YELLOW + 'Dataset could not be merged for ' + municipality 
-                  + ' because scraping results are incomplete. Will re-try next iteration. ' 
-                  + 'Continuing...' + Style.RESET_ALL)
-            continue
+                break
+        # language loop close
+    waits = ' (' + missed_waits_report() + ')'
+    if ((df_stored is not None) & (rev_count == 0)):
+        return (ags, target_id, target_name, None, 'No new reviews.' + waits)
+    # create dataframe per restaurant
+    for attr in attributes_restaurant: 
+        data[attr] = data[attr]*rev_count # expand fixed restaurant info
+    df = pd.DataFrame.from_dict(data)
+    if (df_stored is not None):
+        df = pd.concat([df_stored, df], ignore_index=True)
+        waits = ' (' + str(rev_count) + ' new reviews, ' + missed_waits_report() + ')'
     
-    # re-init scraper after completion (will exit when everything is scraped)
-    init_scraper(driver, wait)
+    ### save dataframe per restaurant after some basic checks
+    # Drop duplicates: last resort technique to prevent that translated reviews
+    # appear twice (usually the check in the review loop works, but not always). 
+    df.drop_duplicates(subset=['review_id'], keep='last', inplace=True)
+    missings = df.isnull().sum().sum()
+    rev_count_site = int(re.sub(r'[^\d]+', '', 
+        driver.find_element(By.CSS_SELECTOR, 'span.reviews_header_count').text
+        ))
+    if (len(df)==0):
+        result = (ags, target_id, target_name, None, 
+                Fore.YELLOW + 'Dataframe not saved: Length is 0' + Style.RESET_ALL + waits)
+    elif (len(df) < rev_count_site):
+        # A scraped review count lower than the review count on page usually happens
+        # when reviews do not load properly. There might also be a slight chance that 
+        # new reviews get added while we scrape, but this is uncheckable in the process. 
+        # A new scraping iteration should fix both.
+        # A higher review count does not matter as long as there are no duplicates (which
+        # is fixed above). Also: The Tripadvisor count is sometimes 1 too large. 
+        result = (ags, target_id, target_name, None, 
+                Fore.YELLOW 
+                + 'Dataframe not saved: Length (after dropping potential duplicates) is ' 
+                + 'smaller than page review count ('+ str(len(df)) + ' vs. ' 
+                + str(rev_count_site) + ')' + Style.RESET_ALL + waits)
+    elif (missings > (0.5*len(df)*len(df.columns))):
+        result = (ags, target_id, target_name, None, 
+                Fore.YELLOW + 'Dataframe not saved: >50 % ('
+                + str(missings) + '/' + str(len(df)*len(df.columns)) + ') missing.'
+                + Style.RESET_ALL + waits)
+    else:
+        # Use categorical dtypes wherever possible
+        columns_categorical = [
+            'id', 'name', 'url', 'street_w_no', 'postcode', 'municipality', 'ags', 
+            'cuisine1', 'cuisine2', 'cuisine3', 'review_user_name', 'review_user_gender', 
+            'review_user_age', 'review_user_municipality', 'review_user_country', 
+            'review_user_id', 'review_language'
+        ]
+        for col in columns_categorical:
+            df[col] = df[col].astype('category')
+        # save under temp (will be deleted after dataset is complete for municipality)
+        # data can be feather instead of CSV
+        # one file per restaurant, so workers never write to the same file
+        relpath_results_restaurants = (
+            'data/temp/tripadvisor_results_restaurant_' 
+            + file_suffix_from_municipality_name(municipality)
+            + '_' + ags + '_'+ target_id + '.feather'
+            )
+        with metrics.timer('feather_write'):
+            df.reset_index().to_feather(wd + relpath_results_restaurants)
+        result = (ags, target_id, target_name, relpath_results_restaurants, 
+                Fore.GREEN + 'Dataframe saved: ' + relpath_results_restaurants + Style.RESET_ALL
+                + waits)
+    # pages are scraped anew if the checks failed (e.g. reviews that did not load)
+    checkpoint_store.delete_review_pages(store, ags, target_id)
+    return result
 
+def scrape_claimed_restaurant(target):
+    # claim target in checkpoint store, scrape, and complete it (or release it for a re-try)
+    municipality, ags, target_id, target_name, target_link = target
+    if (checkpoint_store.claim_restaurant(store, ags, target_id) == False):
+        return (ags, target_id, target_name, None, 
+                'Skipped: already scraped or claimed by another process.')
+    relpath_results_restaurants = None
+    metrics.start_restaurant()
+    try:
+        result = scrape_restaurant(target)
+        relpath_results_restaurants = result[3]
+    finally:
+        with metrics.timer('log_write'):
+            checkpoint_store.complete_restaurant(
+                store, ags, target_id, relpath_results_restaurants
+                )
+        metrics.end_restaurant(
+            ags=ags, id=target_id, saved=(relpath_results_restaurants is not None)
+            )
+    return result
 
-##### RUN #####
-driver = webdriver.Firefox(
-    service=Service(GeckoDriverManager().install()), 
-    options=options
-)
-driver.implicitly_wait(1)
-wait = WebDriverWait(driver, 10) 
-time_start = time.perf_counter()
-# start scraper with some top-level exception handling
-restarts_after_error = 0
-try:
-    init_scraper(driver, wait)
-except (InvalidSessionIdException) as e:
-    # restart driver if connection to driver is lost (e.g. due to crash)
-    print('')
-    print(Fore.YELLOW + 'InvalidSessionIdException: ' + str(e))
-    if (restarts_after_error<3):
-        restarts_after_error+=1
-        print(Fore.YELLOW + 'Restarting scraper...' + Style.RESET_ALL)
-        print('')
-        driver = webdriver.Firefox(
-            service=Service(GeckoDriverManager().install()), 
-            options=options
+def refresh_restaurant(target):
+    # incremental re-scrape of a scraped restaurant (target with path of stored dataset)
+    municipality, ags, target_id, target_name, target_link, relpath_results_restaurants = target
+    df_stored = pd.read_feather(wd + relpath_results_restaurants)
+    df_stored = df_stored.drop(columns=['index'], errors='ignore')
+    df_stored = df_stored.astype(
+        {col: object for col in df_stored.select_dtypes('category').columns}
+        )
+    metrics.start_restaurant()
+    result = None
+    try:
+        result = scrape_restaurant(target[:5], df_stored=df_stored)
+    finally:
+        metrics.end_restaurant(
+            ags=ags, id=target_id, refresh=True, 
+            saved=((result is not None) and (result[3] is not None))
+            )
+    return result
+
+def scrape_restaurant_in_worker(target, scrape=scrape_claimed_restaurant):
+    # wrapper for the browser pool: errors which only concern the current page are reported
+    # back as not saved (target is re-tried next iteration) instead of stopping the pool
+    global driver, wait
+    try:
+        return scrape(target)
+    except InvalidSessionIdException as e:
+        # browser of this worker crashed, start a new one for the next target
+        quit_driver()
+        driver, wait = start_driver(crashed=True)
+        message = 'InvalidSessionIdException: ' + str(e).strip()
+    except (TimeoutException, StaleElementReferenceException) as e:
+        # page load timeouts and block pages are reported to the throttle by load_page()
+        message = 'TimeoutException/StaleElementReferenceException: ' + str(e).strip()
+    ags, target_id, target_name = target[1:4]
+    return (ags, target_id, target_name, None, 
+            Fore.YELLOW + 'Dataframe not saved: ' + message + Style.RESET_ALL)
+
+def warm_up_profile(driver):
+    # visit Tripadvisor once and accept the cookie consent (saved in the profile template)
+    throttle.wait('page')
+    driver.get(base_url + '/Restaurants')
+    cookie_prompt = WebDriverWait(driver, 10).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, '#onetrust-accept-btn-handler'))
+        )
+    driver.execute_script('arguments[0].click();', cookie_prompt)
+    WebDriverWait(driver, 10).until(
+        lambda driver: driver.get_cookie('OptanonAlertBoxClosed') is not None
         )
+
+def prepare_browser_profile():
+    # create the warm profile template once (browsers start cold if this fails)
+    try:
+        if (browser.create_profile_template(
+                options, browser.geckodriver_path(path_geckodriver_cache), 
+                path_profile_template, warm_up_profile
+                )):
+            print('Browser profile template created: ' + path_profile_template)
+    except (TimeoutException, WebDriverException) as e:
+        print(Fore.YELLOW + 'Browser profile template could not be created, starting '
+              + 'browsers with a fresh profile: ' + str(e).strip() + Style.RESET_ALL)
+
+def start_driver(crashed=False):
+    # start a (headless) Firefox instance, returns driver and default wait; after a crash 
+    # a spare browser is kept ready from now on (TRIPADVISOR_SPARE_BROWSER=crash)
+    global browser_factory
+    if (browser_factory is None):
+        browser_factory = browser.BrowserFactory(
+            options, path_geckodriver_cache, path_profile_template, 
+            spare=(spare_browser == '1')
+            )
+    if (crashed & (spare_browser == 'crash')):
+        browser_factory.spare = True
+    driver = browser_factory.get()
+    driver.implicitly_wait(0) # optional elements are probed, explicit waits where needed
+    wait = WebDriverWait(driver, 10)
+    return driver, wait
+
+def init_worker(shared_throttle, shared_reviewer_cache):
+    # each worker process of the browser pool owns one browser (module-global like in main)
+    # and its own connection to the checkpoint store, the throttle and the reviewer cache 
+    # stats are shared by all workers
+    global driver, wait, throttle, reviewer_cache, store, session, metrics, browser_factory
+    # forked workers inherit the browser and factory (spare browser) of the main process,
+    # each worker starts its own (the inherited ones are never used or quit here)
+    driver = None
+    browser_factory = None
+    throttle = shared_throttle
+    reviewer_cache = shared_reviewer_cache
+    metrics = Metrics(path_metrics, name='tripadvisor') # own histograms/files per worker
+    store = checkpoint_store.connect(path_checkpoint_store)
+    session = http_fetch.new_session()
+    driver, wait = start_driver()
+    # quit browsers when the worker process exits after pool.close()
+    Finalize(None, quit_browsers, exitpriority=10)
+
+def quit_driver():
+    # quit current browser (may have crashed already), remove its profile copy
+    try:
+        browser.quit_browser(driver)
+    except WebDriverException:
+        pass
+
+def quit_browsers():
+    quit_driver()
+    if (browser_factory is not None):
+        browser_factory.close()
+
+def merge_restaurant_results(municipality, ags, df_query_restaurants, df_query_municipalities):
+    '''
+    Combine restaurant datasets per municipality and save the municipality dataset.
+    Keeps track in the checkpoint store and the README.
+    '''
+    # append: restaurant files are read twice (union categoricals, then streamed into the
+    # municipality file), linear in the number of restaurants and bounded in memory
+    # save feather and delete delete restaurant result spreadsheets when successful
+    try:
+        relpath_results_municipality = (
+            'data/raw/tripdavisor_results_' 
+            + file_suffix_from_municipality_name(municipality)
+            + '_' + ags + '.feather'
+            )
+        with metrics.timer('feather_write'):
+            tripadvisor_dataset.merge_feather_files(
+                [wd + relpath for relpath in df_query_restaurants['scraped']], 
+                wd + relpath_results_municipality
+                )
+        save_success = True
+        print(' ├─ ' + Fore.GREEN + 'Merged dataset saved: ' 
+              + relpath_results_municipality + Style.RESET_ALL)
+    except Exception:
+        save_success = False
+        print(' └─ ' + Fore.RED + 'Merged dataset for ' + municipality 
+              + ' could not be saved.' + Style.RESET_ALL)
+    if (save_success == True):
+        # delete temp files (if any)
+        # for relpath_results_restaurants in df_query_restaurants['scraped']:
+        #     try:
+        #         os.remove(wd + relpath_results_restaurants)
+        #     except FileNotFoundError:
+        #         pass
+        # add municipality to the partitioned Parquet dataset (replaces earlier exports)
+        try:
+            with metrics.timer('parquet_write'):
+                tripadvisor_dataset.export_municipality_to_parquet(
+                    wd + relpath_results_municipality, 
+                    wd + 'data/processed/tripadvisor_reviews'
+                    )
+            print(' ├─ ' + Fore.GREEN + 'Exported to Parquet dataset: '
+                  + 'data/processed/tripadvisor_reviews' + Style.RESET_ALL)
+        except Exception as e:
+            print(' ├─ ' + Fore.YELLOW + 'Parquet export failed (re-run '
+                  + 'src/tripadvisor_dataset.py to rebuild): ' + str(e) + Style.RESET_ALL)
+        # bulk postcode check (restaurants listed under the municipality but located elsewhere)
+        try:
+            postcodes_outside, postcodes_missing, restaurants = check_restaurant_postcodes(
+                wd + relpath_results_municipality, ags
+                )
+            if ((postcodes_outside > 0) | (postcodes_missing > 0)):
+                print(' ├─ ' + Fore.YELLOW + str(postcodes_outside) + ' of ' + str(restaurants)
+                      + ' restaurants with postcodes outside the municipality, ' 
+                      + str(postcodes_missing) + ' without postcode.' + Style.RESET_ALL)
+        except Exception as e:
+            print(' ├─ ' + Fore.YELLOW + 'Postcode check failed: ' + str(e) + Style.RESET_ALL)
+        # replace status in checkpoint store with link to feather file
+        set_municipality_status(
+            df_query_municipalities, ags, 'scraped', relpath_results_municipality
+            )
+        node_shard.complete(ags) # other nodes skip the municipality
+        # update status file, README is pushed in the background
+        print(' └─ ' + Fore.GREEN 
+              + status_reporter.update(*checkpoint_store.count_scraped_municipalities(store))
+              + Style.RESET_ALL)
+
+def complete_municipality(municipality, ags, df_query_municipalities):
+    # merge ONLY when everything is complete for a municipality
+    df_query_restaurants = checkpoint_store.read_restaurants(store, ags)
+    print(ags + ' ' + municipality)
+    if (df_query_restaurants['scraped'].isnull().sum()==0):
+        merge_restaurant_results(
+            municipality, ags, df_query_restaurants, df_query_municipalities
+            )
     else:
-        print(Fore.RED + 'Scraper stopped after 3 errors.' + Style.RESET_ALL)
-        print('Total running duration: ' 
-                 + str(timedelta(seconds=time.perf_counter()-time_start)))
-        sys.exit('Exiting...')
-except (TimeoutException, StaleElementReferenceException) as e:
-    # when timeout occurs, wait for 1 minute and restart
-    print(Fore.YELLOW + 'TimeoutException/StaleElementReferenceException: ' + str(e))
-    if (restarts_after_error<3):
-        restarts_after_error+=1
-        print(Fore.YELLOW + 'Restarting scraper...' + Style.RESET_ALL)
-        print('')
-        time.sleep(60)
-        init_scraper(driver, wait)
+        print(' └─ ' + Fore.YELLOW + 'Dataset could not be merged for ' + municipality 
+              + ' because scraping results are incomplete. Will re-try next iteration. ' 
+              + 'Continuing...' + Style.RESET_ALL)
+
+def print_restaurant_result(ags, target_name, message):
+    if (n_workers > 1):
+        print(' ├─ ' + ags + ' ' + target_name)
     else:
-        print(Fore.RED + 'Scraper stopped after 3 errors.' + Style.RESET_ALL)
-        print('Total running duration: ' 
-                 + str(timedelta(seconds=time.perf_counter()-time_start)))
-        sys.exit('Exiting...')
-except (WebDriverException) as e:
-    # something like a net-error should induce a waiting time (10 minutes)
-    print(Fore.YELLOW + 'WebDriverException: ' + str(e))
-    if (restarts_after_error<3):
-        restarts_after_error+=1
-        print(Fore.YELLOW + 'Restarting scraper...' + Style.RESET_ALL)
         print('')
-        time.sleep(600)
-        init_scraper(driver, wait)
+    print(' │  └─ ' + message)
+
+def scrape_target_info(df_query_municipalities, municipalities_to_be_scraped):
+    '''
+    Restaurants of all municipalities are put in one queue and scraped by a pool of 
+    n_workers browsers (sequentially in the main process if n_workers = 1):
+    - Scrape restaurant info and reviews for each target (keep track)
+    - Save dataset for each target
+    - Merge datasets for all targets and save municipality dataset (keep track)
+    Workers claim and complete their targets in the checkpoint store, the main process 
+    merges a municipality once its last target is done.
+    '''
+    print('')
+    print('Scraping restaurant info/reviews:')
+    print('---------------------------------')
+
+    ### build restaurant queue over all municipalities (check if already scraped)
+    targets = []
+    query_restaurants = {} # per ags: municipality, targets left
+    for municipality, ags in zip(
+            municipalities_to_be_scraped['municipality'], 
+            municipalities_to_be_scraped['ags']
+            ):
+        df_query_restaurants = checkpoint_store.read_restaurants(store, ags)
+        targets_municipality = df_query_restaurants[
+            df_query_restaurants['scraped'].isin([np.nan])
+            ]
+        for target_id, target_name, target_link in zip(
+                targets_municipality['id'], targets_municipality['name'], 
+                targets_municipality['url']
+                ):
+            targets.append((municipality, ags, target_id, target_name, target_link))
+        query_restaurants[ags] = [municipality, len(targets_municipality)]
+    print(str(len(targets)) + ' restaurants in queue, scraped by ' + str(n_workers) 
+          + ' browser(s).')
+
+    # municipalities without open targets only need to be merged
+    for ags in query_restaurants.keys():
+        if (query_restaurants[ags][1] == 0):
+            complete_municipality(query_restaurants[ags][0], ags, df_query_municipalities)
+
+    def process_results(results):
+        # print results, merge municipality after its last restaurant
+        for ags, target_id, target_name, relpath_results_restaurants, message in results:
+            print_restaurant_result(ags, target_name, message)
+            node_shard.renew(ags) # still working on the municipality
+            query_restaurants[ags][1] -= 1
+            if (query_restaurants[ags][1] == 0):
+                complete_municipality(
+                    query_restaurants[ags][0], ags, df_query_municipalities
+                    )
+
+    ### loop over restaurants
+    run_targets(targets, scrape_claimed_restaurant, process_results)
+    print(throttle.report())
+    print(reviewer_cache.report())
+    print(metrics.report())
+    metrics.flush()
+
+def run_targets(targets, scrape, process_results):
+    # scrape targets in the main process (n_workers = 1) or with the browser pool
+    if ((n_workers > 1) & (len(targets) > 0)):
+        pool = multiprocessing.Pool(
+            processes=min(n_workers, len(targets)), initializer=init_worker, 
+            initargs=(throttle, reviewer_cache)
+            )
+        try:
+            process_results(pool.imap_unordered(
+                partial(scrape_restaurant_in_worker, scrape=scrape), targets
+                ))
+            pool.close()
+        except BaseException:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+    else:
+        process_results(map(scrape, targets))
+
+def refresh_scraped_restaurants(df_query_municipalities):
+    '''
+    Incremental re-scrape (TRIPADVISOR_REFRESH=1) of all scraped restaurants: only reviews 
+    newer than the stored ones are scraped and appended to the restaurant datasets. 
+    Municipalities with new reviews are merged again (and re-exported to Parquet).
+    '''
+    print('')
+    print('Refreshing scraped restaurants:')
+    print('-------------------------------')
+    targets = []
+    query_restaurants = {} # per ags: municipality, targets left, restaurants with new reviews
+    # scraped municipalities are refreshed by their deterministic shard (no leases)
+    municipalities_scraped = df_query_municipalities[
+        (~df_query_municipalities['scraped'].isin([np.nan]))
+        & (df_query_municipalities['ags'].apply(
+            lambda ags: sharding.shard_of(ags, node_shard.n_shards) == node_shard.shard
+            ))
+        ]
+    for municipality, ags in zip(
+            municipalities_scraped['municipality'], municipalities_scraped['ags']
+            ):
+        df_query_restaurants = checkpoint_store.read_restaurants(store, ags)
+        df_query_restaurants = df_query_restaurants[
+            ~df_query_restaurants['scraped'].isin([np.nan])
+            ]
+        for target_id, target_name, target_link, relpath_results_restaurants in zip(
+                df_query_restaurants['id'], df_query_restaurants['name'], 
+                df_query_restaurants['url'], df_query_restaurants['scraped']
+                ):
+            targets.append((municipality, ags, target_id, target_name, target_link, 
+                            relpath_results_restaurants))
+        query_restaurants[ags] = [municipality, len(df_query_restaurants), 0]
+    print(str(len(targets)) + ' restaurants in ' + str(len(query_restaurants)) 
+          + ' municipalities to be refreshed.')
+
+    def process_results(results):
+        # print results, merge municipality again after its last restaurant if it changed
+        for ags, target_id, target_name, relpath_results_restaurants, message in results:
+            print_restaurant_result(ags, target_name, message)
+            query_restaurants[ags][1] -= 1
+            if (relpath_results_restaurants is not None):
+                query_restaurants[ags][2] += 1
+            if ((query_restaurants[ags][1] == 0) & (query_restaurants[ags][2] > 0)):
+                complete_municipality(
+                    query_restaurants[ags][0], ags, df_query_municipalities
+                    )
+
+    run_targets(targets, refresh_restaurant, process_results)
+    print(throttle.report())
+    print(reviewer_cache.report())
+    print(metrics.report())
+    metrics.flush()
+
+def run_async_engine(df_query_municipalities):
+    '''
+    Alternative to run_scheduler() (TRIPADVISOR_ENGINE=async) in one pass:
+    (2) Discovery: the main browser collects the scraping targets of one municipality 
+        after another.
+    (3) Scraping/merge: restaurants of a municipality are handed to the browser pool 
+        (n_workers processes) as soon as its targets are known, i.e. while later 
+        municipalities are still discovered. Municipalities are merged after their last 
+        restaurant.
+    Steps of the main process (discovery, merges) run one at a time in a single thread, 
+    as they share the main browser and the checkpoint store connection. File writes are 
+    part of the steps (blocking in their process/thread). If a pool worker dies (e.g. 
+    Firefox killed), the pool is rebuilt and its restaurants are queued again.
+
+    Returns True when everything is scraped.
+    '''
+    while True:
+        # one pass per batch of claimed municipalities (a single pass without leases)
+        progress_before = scheduler_progress(df_query_municipalities)
+        municipalities_claimed = asyncio.run(crawl_municipalities(df_query_municipalities))
+        if ((node_shard.path_leases is None) | (municipalities_claimed == 0)):
+            break
+        if (scheduler_progress(df_query_municipalities) == progress_before):
+            # leave them to other nodes, next pass claims others (ends when none are left)
+            node_shard.release_held()
+    municipalities_left = df_query_municipalities['scraped'].isnull().sum()
+    if (municipalities_left == 0):
+        print('Information has been scraped for all municipalities and restaurants.')
     else:
-        print(Fore.RED + 'Scraper stopped after 3 errors.' + Style.RESET_ALL)
-        print('Total running duration: ' 
-                 + str(timedelta(seconds=time.perf_counter()-time_start)))
-        sys.exit('Exiting...')
+        print(Fore.YELLOW + str(municipalities_left) + ' municipalities not (completely) '
+              + 'scraped, re-run or check manually.' + Style.RESET_ALL)
+    return (municipalities_left == 0)
+
+async def crawl_municipalities(df_query_municipalities):
+    # see run_async_engine()
+    crawl_engine = CrawlEngine(max_steps=max_steps, max_per_host=max_per_host)
+    loop = asyncio.get_event_loop()
+    main_thread = ThreadPoolExecutor(max_workers=1)
+
+    def new_pool():
+        return ProcessPoolExecutor(
+            max_workers=n_workers, initializer=init_worker, initargs=(throttle, reviewer_cache)
+            )
+
+    pools = [new_pool()] # current pool (replaced when broken)
+    # restaurants handed to the pool at once (keeps a slot free for the discovery)
+    browsers = asyncio.Semaphore(n_workers)
+
+    async def scrape(target, attempts=3):
+        async with browsers:
+            for attempt in range(attempts):
+                pool = pools[-1]
+                try:
+                    return await crawl_engine.run_step(
+                        pool, target[4], scrape_restaurant_in_worker, target
+                        )
+                except BrokenProcessPool:
+                    # a worker died (e.g. Firefox killed): the first step to notice rebuilds 
+                    # the pool, the restaurants in flight are queued again
+                    if (pools[-1] is pool):
+                        print(Fore.YELLOW + 'Browser pool broken, restarting workers.' 
+                              + Style.RESET_ALL)
+                        pool.shutdown(wait=False)
+                        pools.append(new_pool())
+        ags, target_id, target_name = target[1:4]
+        return (ags, target_id, target_name, None, 
+                Fore.YELLOW + 'Dataframe not saved: browser pool broke ' + str(attempts) 
+                + ' times.' + Style.RESET_ALL)
+
+    async def scrape_municipality(municipality, ags):
+        df_query_restaurants = await loop.run_in_executor(
+            main_thread, checkpoint_store.read_restaurants, store, ags
+            )
+        targets_municipality = df_query_restaurants[
+            df_query_restaurants['scraped'].isin([np.nan])
+            ]
+        tasks = [
+            asyncio.ensure_future(scrape((municipality, ags, target_id, target_name, target_link)))
+            for target_id, target_name, target_link in zip(
+                targets_municipality['id'], targets_municipality['name'], 
+                targets_municipality['url']
+                )
+            ]
+        for task in asyncio.as_completed(tasks):
+            ags, target_id, target_name, relpath_results_restaurants, message = await task
+            print_restaurant_result(ags, target_name, message)
+            node_shard.renew(ags)
+        await loop.run_in_executor(
+            main_thread, complete_municipality, municipality, ags, df_query_municipalities
+            )
+
+    claimed = claimed_municipalities(df_query_municipalities)
+    municipalities_to_be_scraped = df_query_municipalities[
+        (~df_query_municipalities['scraping_targets'].isin([np.nan]))
+        & df_query_municipalities['scraped'].isin([np.nan])
+        & claimed
+        ]
+    municipalities_to_be_discovered = df_query_municipalities[
+        (df_query_municipalities['scraping_targets'].isin([np.nan]))
+        & (~df_query_municipalities['querystring'].isin([np.nan]))
+        & claimed
+        ]
+    print(str(len(municipalities_to_be_scraped)) + ' municipalities to be scraped, '
+          + str(len(municipalities_to_be_discovered)) + ' to be discovered.')
+    try:
+        tasks = [
+            asyncio.ensure_future(scrape_municipality(municipality, ags))
+            for municipality, ags in zip(
+                municipalities_to_be_scraped['municipality'], 
+                municipalities_to_be_scraped['ags']
+                )
+            ]
+        for index in municipalities_to_be_discovered.index:
+            municipality, ags = municipalities_to_be_discovered.loc[
+                index, ['municipality', 'ags']
+                ]
+            await crawl_engine.run_step(
+                main_thread, base_url + '/Restaurants', 
+                get_scraping_targets, df_query_municipalities, 
+                municipalities_to_be_discovered.loc[[index]]
+                )
+            relpath_targets = df_query_municipalities.loc[
+                df_query_municipalities['ags'] == ags, 'scraping_targets'
+                ].iloc[0]
+            if (pd.isnull(relpath_targets) == False):
+                tasks.append(asyncio.ensure_future(scrape_municipality(municipality, ags)))
+        await asyncio.gather(*tasks)
+        return (len(municipalities_to_be_scraped) + len(municipalities_to_be_discovered))
+    finally:
+        pools[-1].shutdown(wait=True)
+        main_thread.shutdown(wait=True)
+        print(crawl_engine.report())
+        print(throttle.report())
+        print(reviewer_cache.report())
+        print(metrics.report())
+        metrics.flush()
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    store = checkpoint_store.connect(path_checkpoint_store)
+    print(node_shard.describe())
+    prepare_browser_profile()
+    driver, wait = start_driver()
+    time_start = time.perf_counter()
+    df_query_municipalities = init_scraper()
+    # run scheduler with some top-level exception handling (restart at most 3 times)
+    restarts_after_error = 0
+    while True:
+        try:
+            if (refresh == True):
+                refresh_scraped_restaurants(df_query_municipalities)
+            elif (engine == 'async'):
+                run_async_engine(df_query_municipalities)
+            else:
+                run_scheduler(df_query_municipalities)
+            break
+        except (InvalidSessionIdException) as e:
+            # restart driver if connection to driver is lost (e.g. due to crash)
+            print('')
+            print(Fore.YELLOW + 'InvalidSessionIdException: ' + str(e))
+            waiting_time = 0
+            driver_restart = True
+        except (TimeoutException, StaleElementReferenceException) as e:
+            # when timeout occurs, wait for 1 minute and restart (throttle backed off already
+            # by load_page/load_html if a page load failed)
+            print(Fore.YELLOW + 'TimeoutException/StaleElementReferenceException: ' + str(e))
+            waiting_time = 60
+            driver_restart = False
+        except (WebDriverException) as e:
+            # something like a net-error should induce a waiting time (10 minutes)
+            print(Fore.YELLOW + 'WebDriverException: ' + str(e))
+            waiting_time = 600
+            driver_restart = False
+        if (restarts_after_error<3):
+            restarts_after_error+=1
+            print(Fore.YELLOW + 'Restarting scraper...' + Style.RESET_ALL)
+            print('')
+            time.sleep(waiting_time)
+            if (driver_restart == True):
+                quit_driver()
+                driver, wait = start_driver(crashed=True)
+        else:
+            print(Fore.RED + 'Scraper stopped after 3 errors.' + Style.RESET_ALL)
+            break
+    print('Total running duration: ' 
+             + str(timedelta(seconds=time.perf_counter()-time_start)))
+    status_reporter.close() # last README push
+    quit_browsers()
+    sys.exit('Exiting...')
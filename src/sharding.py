@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file splits the municipality workload across several scraper nodes (machines/IPs).
+
+Two modes:
+- Deterministic shards: node i of n works on the municipalities whose AGS hashes to i
+  (stable across runs and machines, no coordination needed).
+- Leases: nodes claim municipalities dynamically through lease files in a directory on a
+  shared filesystem (<ags>.lease, created atomically). Leases are renewed while a node
+  works on a municipality and expire if it crashes, so other nodes take them over.
+  Finished municipalities are marked with <ags>.done and never claimed again. Leases
+  without progress are released and left to other nodes for the rest of the run.
+
+Every node keeps its own checkpoint store, all output files are named by AGS (and
+restaurant id), so node outputs do not collide. Run this file to merge the node stores:
+
+    python src/sharding.py data/raw/tripadvisor_checkpoints_<node>.sqlite ...
+
+'''
+
+# imports
+import os
+import sys
+import time
+import zlib
+import socket
+from pathlib import Path
+
+##### FUNCTIONS #####
+
+def shard_of(ags, n_shards):
+    # stable shard number of a municipality (crc32, unlike hash() not salted per process)
+    return zlib.crc32(str(ags).encode('utf-8')) % n_shards
+
+def parse_shard(string):
+    # 'i/n' -> (i, n)
+    shard, n_shards = [int(part) for part in string.split('/')]
+    if ((shard < 0) | (shard >= n_shards)):
+        raise ValueError('Shard ' + string + ' out of range (expected i/n with 0 <= i < n).')
+    return shard, n_shards
+
+def read_lease(path):
+    # (node, expiry) of a lease file, None if it does not exist (anymore)
+    try:
+        with open(path) as f:
+            node, expiry = f.read().split('\n')[:2]
+        return node, float(expiry)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def write_lease(path, node, lease_seconds, exclusive):
+    # exclusive: fails with FileExistsError if the lease exists (atomic on POSIX and NFSv3+)
+    flags = os.O_WRONLY | os.O_CREAT | (os.O_EXCL if exclusive else os.O_TRUNC)
+    fd = os.open(path, flags)
+    with os.fdopen(fd, 'w') as f:
+        f.write(node + '\n' + str(time.time() + lease_seconds) + '\n')
+
+##### CLASSES #####
+
+class Shard:
+
+    def __init__(self, node=None, shard=0, n_shards=1, path_leases=None,
+                 lease_seconds=7200, batch=5):
+        self.node = node if (node is not None) else socket.gethostname()
+        self.shard = shard
+        self.n_shards = n_shards
+        self.path_leases = path_leases # None = deterministic shards
+        self.lease_seconds = lease_seconds
+        self.batch = batch # municipalities claimed at once per node
+        self.held = set() # municipalities claimed in the last claim()
+        self.released = set() # released without progress, not claimed again by this node
+        if (self.path_leases is not None):
+            os.makedirs(self.path_leases, exist_ok=True)
+
+    def lease_path(self, ags, extension='lease'):
+        return os.path.join(self.path_leases, str(ags) + '.' + extension)
+
+    def is_done(self, ags):
+        return ((self.path_leases is not None)
+                and os.path.exists(self.lease_path(ags, 'done')))
+
+    def holds(self, ags):
+        lease = read_lease(self.lease_path(ags))
+        return ((lease is not None) and (lease[0] == self.node) and (lease[1] > time.time()))
+
+    def try_claim(self, ags):
+        path = self.lease_path(ags)
+        try:
+            write_lease(path, self.node, self.lease_seconds, exclusive=True)
+            return True
+        except FileExistsError:
+            pass
+        lease = read_lease(path)
+        if ((lease is None) or (lease[1] > time.time())):
+            return False
+        # expired lease (crashed node): replaced under a takeover lock, only the node holding 
+        # the lock re-checks that the lease is still the expired one and overwrites it
+        path_lock = path + '.takeover'
+        try:
+            os.close(os.open(path_lock, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+        except FileExistsError:
+            # lock of a node that crashed during a takeover
+            try:
+                if (time.time() - os.path.getmtime(path_lock) > 60):
+                    os.remove(path_lock)
+            except FileNotFoundError:
+                pass
+            return False
+        try:
+            if (read_lease(path) != lease):
+                return False
+            write_lease(path, self.node, self.lease_seconds, exclusive=False)
+            return True
+        finally:
+            os.remove(path_lock)
+
+    def claim(self, ags_list):
+        '''
+        Municipalities (of ags_list, i.e. not done locally) this node works on now:
+        its deterministic shard, or the leases it holds plus new ones up to batch.
+        '''
+        if (self.path_leases is None):
+            return [ags for ags in ags_list if (shard_of(ags, self.n_shards) == self.shard)]
+        ags_list = [ags for ags in ags_list 
+                    if ((ags not in self.released) and (self.is_done(ags) == False))]
+        claimed = [ags for ags in ags_list if self.holds(ags)]
+        for ags in claimed:
+            self.renew(ags)
+        for ags in ags_list:
+            if (len(claimed) >= self.batch):
+                break
+            if ((ags not in claimed) and self.try_claim(ags)):
+                claimed.append(ags)
+        self.held = set(claimed)
+        return claimed
+
+    def release_held(self):
+        # give up the current claims (no progress), other nodes may take them over; 
+        # returns the number of released municipalities
+        if (self.path_leases is None):
+            return 0
+        released = len(self.held)
+        for ags in self.held:
+            if (self.holds(ags)):
+                os.remove(self.lease_path(ags))
+        self.released |= self.held
+        self.held = set()
+        return released
+
+    def renew(self, ags):
+        # extend own lease while working on the municipality
+        if ((self.path_leases is not None) and self.holds(ags)):
+            write_lease(self.lease_path(ags), self.node, self.lease_seconds, exclusive=False)
+
+    def complete(self, ags):
+        # mark municipality as done for all nodes, release the lease
+        if (self.path_leases is None):
+            return
+        Path(self.lease_path(ags, 'done')).write_text(self.node + '\n')
+        if (self.holds(ags)):
+            os.remove(self.lease_path(ags))
+
+    def describe(self):
+        if (self.path_leases is None):
+            return 'node %s: shard %i of %i' % (self.node, self.shard, self.n_shards)
+        return ('node %s: leases in %s (batch %i, expiry %i s)'
+                % (self.node, self.path_leases, self.batch, self.lease_seconds))
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    # merge node checkpoint stores into the main store
+    try:
+        wd = str(Path(__file__).parents[1].absolute()) + '/'
+    except NameError:
+        wd = str(Path().absolute()) + '/'
+    sys.path.append(wd + 'src')
+    import checkpoint_store
+    con = checkpoint_store.connect(wd + 'data/raw/tripadvisor_checkpoints.sqlite')
+    for path in sys.argv[1:]:
+        municipalities, restaurants = checkpoint_store.merge_store(con, path)
+        print(path + ': ' + str(municipalities) + ' municipalities, ' + str(restaurants)
+              + ' restaurants merged.')
+    print('%i of %i municipalities scraped.' % checkpoint_store.count_scraped_municipalities(con))
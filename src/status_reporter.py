@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file reports the scraping status in the background.
+
+Status updates never wait for git or the network: update() writes the status to a local
+JSON file and returns, a background thread pushes the latest status (e.g. README commit)
+at most every interval_minutes. Updates in between are coalesced into one push, failed
+pushes are retried with the next one. Push latency and failures go to the metrics
+(phase 'readme_push', counter 'readme_push_failures').
+
+'''
+
+# imports
+import os
+import json
+import time
+import threading
+
+##### CLASSES #####
+
+class StatusReporter:
+
+    def __init__(self, path_status, push=None, interval_minutes=10, metrics=None):
+        self.path_status = path_status
+        self.push = push # push(count, total) -> (success, message), None = status file only
+        self.interval_seconds = max(interval_minutes * 60, 1)
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.lock_file = threading.Lock() # status file is written by both threads
+        self.wakeup = threading.Event()
+        self.status = None # latest status (count, total)
+        self.pending = None # latest status not pushed yet
+        self.last_push = None # time, success and message of the last push
+        self.closing = False
+        self.thread = None
+
+    def update(self, count, total):
+        # record status, push happens in the background thread
+        with self.lock:
+            self.status = (count, total)
+            self.pending = (count, total)
+        self.write_status()
+        if (self.push is not None):
+            self.start()
+        return str(count) + '/' + str(total) + ' municipalities scraped (status file updated).'
+
+    def start(self):
+        # one thread per process (started on first update, not inherited by pool workers)
+        if ((self.thread is None) or (self.thread.is_alive() == False)):
+            self.thread = threading.Thread(target=self.run, name='status_reporter', daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while (self.closing == False):
+            self.wakeup.wait(self.interval_seconds)
+            self.wakeup.clear()
+            self.push_pending()
+        self.push_pending() # status updated during the last push
+
+    def push_pending(self):
+        with self.lock:
+            status, self.pending = self.pending, None
+        if (status is None):
+            return
+        time_start = time.perf_counter()
+        try:
+            success, message = self.push(*status)
+        except Exception as e:
+            success, message = False, str(e)
+        if (self.metrics is not None):
+            self.metrics.observe('readme_push', time.perf_counter() - time_start)
+            if (success == False):
+                self.metrics.increment('readme_push_failures')
+        if (success == False):
+            # retry with the next push (unless a newer status is waiting)
+            with self.lock:
+                if (self.pending is None):
+                    self.pending = status
+        self.last_push = {
+            'timestamp': time.time(), 'scraped': status[0], 'success': success, 
+            'message': message
+            }
+        self.write_status()
+
+    def write_status(self):
+        # replace the status file atomically
+        os.makedirs(os.path.dirname(self.path_status), exist_ok=True)
+        with self.lock_file:
+            status = {
+                'timestamp': time.time(),
+                'scraped': self.status[0],
+                'total': self.status[1],
+                'last_push': self.last_push,
+                }
+            with open(self.path_status + '.tmp', 'w') as f:
+                json.dump(status, f, indent=2)
+            os.replace(self.path_status + '.tmp', self.path_status)
+
+    def close(self, timeout=60):
+        # push what is pending once more (waits at most timeout seconds for git)
+        self.closing = True
+        self.wakeup.set()
+        if (self.thread is not None):
+            self.thread.join(timeout)
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file provides the request throttle shared by all browsers of a scraper.
+
+All page loads and clicks wait for a slot of a token bucket. The interval between
+slots is adapted AIMD-style: it shrinks additively while responses are healthy and
+is multiplied on timeouts or block pages. State lives in shared memory, so one
+Throttle created in the main process can be passed to pool workers (initargs).
+
+'''
+
+# imports
+import time
+import multiprocessing
+
+##### CLASSES #####
+
+class Throttle:
+
+    # relative cost of actions (page load = 1), matches the former fixed sleeps
+    # of 3 s per restaurant page, 1 s per page/language switch and 0.5 s per overlay
+    weights = {'page': 1.0, 'click': 1/3, 'overlay': 1/6}
+
+    def __init__(self, interval=3.0, min_interval=0.5, max_interval=120.0,
+                 step=0.1, backoff=2.0, burst=1):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.step = step # additive decrease of interval per healthy response
+        self.backoff = backoff # multiplicative increase of interval per failure
+        self.burst = burst # number of page loads allowed without waiting
+        self.lock = multiprocessing.Lock()
+        self.interval = multiprocessing.Value('d', interval, lock=False)
+        self.next_slot = multiprocessing.Value('d', 0.0, lock=False)
+        self.slept = multiprocessing.Value('d', 0.0, lock=False)
+        self.requests = multiprocessing.Value('i', 0, lock=False)
+        self.failures = multiprocessing.Value('i', 0, lock=False)
+
+    def wait(self, action='page'):
+        # reserve the next free slot and sleep until it is due
+        with self.lock:
+            now = time.time()
+            cost = self.interval.value * self.weights[action]
+            slot = max(now - (self.burst-1)*self.interval.value, self.next_slot.value)
+            self.next_slot.value = slot + cost
+            delay = max(slot - now, 0.0)
+            self.slept.value += delay
+            self.requests.value += 1
+        time.sleep(delay)
+        return delay
+
+    def success(self):
+        # healthy response: speed up (additive decrease)
+        with self.lock:
+            self.interval.value = max(self.interval.value - self.step, self.min_interval)
+
+    def failure(self):
+        # timeout or block page: back off (multiplicative increase)
+        with self.lock:
+            self.interval.value = min(self.interval.value * self.backoff, self.max_interval)
+            self.next_slot.value = max(self.next_slot.value, time.time() + self.interval.value)
+            self.failures.value += 1
+
+    def report(self):
+        with self.lock:
+            return ('Throttle: interval %.2f s, slept %.0f s for %i requests, %i back-offs'
+                    % (self.interval.value, self.slept.value, self.requests.value,
+                       self.failures.value))
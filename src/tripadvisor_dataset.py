@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file combines scraped Tripadvisor results into datasets.
+
+Restaurant datasets (feather) are merged into the municipality dataset in two passes
+over the files: the first pass collects the column types and one union dictionary per
+categorical column, the second pass re-encodes each restaurant against these
+dictionaries and streams it into the output file. Only one restaurant is held in memory
+at a time and nothing is copied more than once.
+
+Municipality datasets are exported into one Hive-partitioned Parquet dataset 
+(data/processed/tripadvisor_reviews/ags_state=<AGS prefix>/review_year=<year>/...), 
+dictionary-encoded and with column statistics, so that subsets (e.g. all reviews in 
+Saxony 2014-2017) are read with partition pruning and predicate pushdown:
+
+    dataset = open_parquet_dataset(wd + 'data/processed/tripadvisor_reviews')
+    df = dataset.to_table(filter=(ds.field('ags_state') == '14') 
+        & (ds.field('review_year') >= 2014) & (ds.field('review_year') <= 2017)).to_pandas()
+
+The scraper input (municipalities with their postcodes) is a typed Parquet file as well:
+postcodes as list<string>, state dictionary-encoded, read memory-mapped without parsing.
+
+Run this file to rebuild (compact) the dataset from all municipality datasets.
+
+'''
+
+# imports
+import os
+import glob
+import shutil
+from pathlib import Path
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+# working dir (Jupyter proof)
+try:
+    wd = str(Path(__file__).parents[1].absolute()) + '/'
+except NameError:
+    wd = str(Path().absolute()) + '/'
+    print('You seem to be using a Jupyter environment.' 
+          'Make sure this points to the repository root: ' 
+          + wd)
+
+# schema of the review dataset (same for all municipalities), partition columns last
+columns_categorical = [
+    'id', 'name', 'url', 'street_w_no', 'postcode', 'municipality', 'ags', 
+    'cuisine1', 'cuisine2', 'cuisine3', 'review_user_name', 'review_user_gender', 
+    'review_user_age', 'review_user_municipality', 'review_user_country', 
+    'review_user_id', 'review_language'
+    ]
+columns_numeric = [
+    'pricerange_lo', 'pricerange_hi', 'review_user_signup', 'review_user_reviews', 
+    'review_user_thumbsup', 'review_user_municipalities_visited', 
+    'review_user_overlay_failed', 'review_score'
+    ]
+# schema of the scraper input (scraper_input_municipalities.py)
+schema_input_municipalities = pa.schema([
+    ('ags', pa.string()),
+    ('municipality', pa.string()),
+    ('state', pa.dictionary(pa.int8(), pa.string())),
+    ('postcodes', pa.list_(pa.string())),
+    ('querystring', pa.string()),
+    ])
+partitioning = ds.partitioning(
+    pa.schema([('ags_state', pa.string()), ('review_year', pa.int16())]), flavor='hive'
+    )
+
+##### FUNCTIONS #####
+
+def read_restaurant_table(path):
+    # restaurant datasets are saved with their pandas index as column 'index'
+    table = feather.read_table(path, memory_map=True)
+    if ('index' in table.column_names):
+        table = table.drop(['index'])
+    return table
+
+def common_type(types):
+    # type all restaurant columns can be cast to (e.g. int64 without, double with missings)
+    types = [t for t in types if (pa.types.is_null(t) == False)]
+    if (len(types) == 0):
+        return pa.null()
+    if (all(t == types[0] for t in types)):
+        return types[0]
+    if (all((pa.types.is_integer(t) | pa.types.is_floating(t)) for t in types)):
+        return pa.float64()
+    return pa.string()
+
+def merged_schema(paths):
+    '''
+    First pass: column order and types of the merged dataset, union dictionary (in order of
+    appearance) for each categorical column. Columns with only missings in a restaurant
+    dataset do not contribute (their pandas dtype is float64 instead of object).
+    '''
+    names = []
+    types = {}
+    categorical = set()
+    values = {}
+    for path in paths:
+        table = read_restaurant_table(path)
+        for name in table.column_names:
+            if (name not in types):
+                names.append(name)
+                types[name] = []
+                values[name] = {}
+            column = table.column(name)
+            if (pa.types.is_dictionary(column.type)):
+                categorical.add(name)
+            if (column.null_count == len(column)):
+                continue
+            if (pa.types.is_dictionary(column.type)):
+                types[name].append(column.type.value_type)
+                for chunk in column.chunks:
+                    for value in chunk.dictionary.to_pylist():
+                        values[name].setdefault(value, len(values[name]))
+            else:
+                types[name].append(column.type)
+    fields = []
+    dictionaries = {}
+    for name in names:
+        value_type = common_type(types[name])
+        if (name in categorical):
+            if (pa.types.is_null(value_type)):
+                value_type = pa.string()
+            dictionaries[name] = pa.array(list(values[name].keys())).cast(value_type)
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), value_type)))
+        else:
+            fields.append(pa.field(name, value_type))
+    return pa.schema(fields), dictionaries
+
+def conform_table(table, schema, dictionaries):
+    # cast restaurant table to merged schema, re-encode categoricals with union dictionaries
+    columns = []
+    for field in schema:
+        if (field.name not in table.column_names):
+            columns.append(pa.nulls(len(table), field.type))
+            continue
+        chunks = []
+        for chunk in table.column(field.name).chunks:
+            if (field.name in dictionaries):
+                union = dictionaries[field.name]
+                if (pa.types.is_dictionary(chunk.type)):
+                    # old code -> new code, applied to all indices at once
+                    recode = pc.index_in(chunk.dictionary.cast(union.type), value_set=union)
+                    indices = pc.take(recode, chunk.indices)
+                else:
+                    indices = pc.index_in(chunk.cast(union.type), value_set=union)
+                chunks.append(pa.DictionaryArray.from_arrays(indices.cast(pa.int32()), union))
+            else:
+                chunks.append(chunk.cast(field.type))
+        columns.append(pa.chunked_array(chunks, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def merge_feather_files(paths, path_output):
+    '''
+    Merge restaurant datasets into one feather file (second pass streams each restaurant
+    into the file). Returns the number of rows written.
+    '''
+    schema, dictionaries = merged_schema(paths)
+    rows = 0
+    with pa.OSFile(path_output, 'wb') as sink:
+        writer = pa.ipc.new_file(
+            sink, schema, options=pa.ipc.IpcWriteOptions(compression='lz4')
+            )
+        for path in paths:
+            table = conform_table(read_restaurant_table(path), schema, dictionaries)
+            writer.write_table(table)
+            rows += len(table)
+        writer.close()
+    return rows
+
+def reviews_schema(names):
+    # fixed types for the Parquet dataset, categoricals are dictionary-encoded, 
+    # all other columns (review date, title, text, id, timestamp) are strings
+    fields = []
+    for name in names:
+        if (name in columns_categorical):
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        elif (name in columns_numeric):
+            fields.append(pa.field(name, pa.float64()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+def review_year(review_date):
+    # year from review date (e.g. '12. Mai 2016'), 0 if missing
+    years = []
+    for chunk in pc.extract_regex(review_date, pattern=r'(?P<year>\d{4})').chunks:
+        years.append(chunk.flatten()[0]) # flatten() keeps non-matches missing
+    return pc.fill_null(pa.chunked_array(years, type=pa.string()).cast(pa.int16()), 0)
+
+def to_reviews_table(table):
+    # cast municipality dataset to the dataset schema, add partition columns
+    names = [name for name in table.column_names if (name not in ['index', 'level_0'])]
+    schema = reviews_schema(names)
+    columns = []
+    for field in schema:
+        column = table.column(field.name)
+        if (pa.types.is_dictionary(column.type)):
+            column = pa.chunked_array(
+                [chunk.dictionary_decode() for chunk in column.chunks], 
+                type=column.type.value_type
+                )
+        if (pa.types.is_dictionary(field.type)):
+            column = column.cast(pa.string()).dictionary_encode()
+        else:
+            column = column.cast(field.type)
+        columns.append(column)
+    table = pa.Table.from_arrays(columns, schema=schema)
+    ags_state = pa.array([ags[:2] if (ags is not None) else '00' 
+                          for ags in table.column('ags').cast(pa.string()).to_pylist()])
+    table = table.append_column('ags_state', ags_state)
+    table = table.append_column('review_year', review_year(table.column('review_date')))
+    return table
+
+def export_municipality_to_parquet(path_municipality, path_dataset):
+    '''
+    Write (or replace) one municipality dataset in the partitioned Parquet dataset.
+    Files are named after the municipality dataset, re-exports overwrite them.
+    '''
+    table = to_reviews_table(feather.read_table(path_municipality))
+    basename = os.path.basename(path_municipality).replace('.feather', '')
+    ds.write_dataset(
+        table, 
+        path_dataset, 
+        format='parquet', 
+        partitioning=partitioning, 
+        basename_template=basename + '-{i}.parquet',
+        file_options=ds.ParquetFileFormat().make_write_options(
+            use_dictionary=True, write_statistics=True, compression='snappy'
+            ),
+        existing_data_behavior='overwrite_or_ignore'
+        )
+    return len(table)
+
+def compact_parquet_dataset(paths_municipalities, path_dataset):
+    # rebuild the whole dataset from the municipality datasets (one file per partition and
+    # municipality, removes files of earlier exports)
+    if (os.path.exists(path_dataset)):
+        shutil.rmtree(path_dataset)
+    rows = 0
+    for path in paths_municipalities:
+        rows += export_municipality_to_parquet(path, path_dataset)
+    return rows
+
+def open_parquet_dataset(path_dataset):
+    # dataset for filtered reads (partition pruning on ags_state/review_year)
+    return ds.dataset(path_dataset, format='parquet', partitioning=partitioning)
+
+def write_input_municipalities(table, path):
+    pq.write_table(
+        table.cast(schema_input_municipalities), path, 
+        use_dictionary=['state'], compression='snappy'
+        )
+
+def read_input_municipalities(path):
+    # scraper input as DataFrame (memory-mapped, state categorical, postcodes as arrays)
+    table = pq.read_table(path, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+##### RUN #####
+if (__name__ == '__main__'):
+    paths = sorted(glob.glob(wd + 'data/raw/tripdavisor_results_*.feather'))
+    rows = compact_parquet_dataset(paths, wd + 'data/processed/tripadvisor_reviews')
+    print(str(rows) + ' reviews of ' + str(len(paths)) + ' municipalities exported to '
+          + 'data/processed/tripadvisor_reviews')
@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+
+'''
+
+This file parses Tripadvisor restaurant, review and user information
+from HTML snapshots (page source or outer HTML of single elements).
+
+It mirrors fetch_data_attribute() in scraper_tripadvisor.py attribute by attribute,
+but works on a local BeautifulSoup tree instead of making WebDriver calls.
+It does not need a browser and can be used on saved HTML files.
+
+The raw strings returned by the in-browser JavaScript extractor (extraction_mode 'js') 
+are converted to attribute values with the same rules (see js_*_record()).
+
+'''
+
+# imports
+import re
+import numpy as np
+import langid
+from bs4 import BeautifulSoup
+
+##### FUNCTIONS #####
+
+def to_int(string):
+    # strip everything but digits ('1.234 Beiträge' -> 1234)
+    return int(re.sub(r'[^\d]+', '', string))
+
+def user_id_from_element_id(element_id):
+    # UID_<user id>-SRC_<review id> -> <user id>
+    value = element_id.split('-', 1)
+    value = value[0].split("_", 1)
+    return value[1]
+
+def score_from_class(class_string):
+    # 'ui_bubble_rating bubble_45' -> 4
+    return int(int(class_string.replace('ui_bubble_rating bubble_',''))/10)
+
+def language_code(lang):
+    # language tag from the markup -> code as in the language filter ('de-DE' -> 'de')
+    return lang.split('-')[0].lower()
+
+def identify_language(string):
+    # offline language identification (langid model, ISO 639-1 code), np.nan without text
+    if ((not isinstance(string, str)) or (string.strip() == '')):
+        return np.nan
+    return langid.classify(string)[0]
+
+def user_description(description, attr):
+    # gender, age, municipality, country from the 2nd member description item
+    # e.g. 'Mann, 35-49 aus Berlin, Deutschland'
+    if (attr == 'review_user_gender'):
+        if ('Mann' in description):
+            value = 'Mann'
+        elif ('Frau' in description):
+            value = 'Frau'
+        else:
+            value = np.nan
+    elif (attr == 'review_user_age'):
+        value = re.findall(r'[0-9]+-[0-9]+', description)[0]
+    elif (attr == 'review_user_municipality'):
+        value = description.split(', ', 1)
+        if ('aus' in value[0]):
+            value = value[0].split(' aus ', 1)
+            value = value[1]
+        elif ('Aus' in value[0]):
+            value = value[0].replace('Aus ', '')
+        else:
+            value = np.nan
+    elif (attr == 'review_user_country'):
+        value = description.split(', ', 1)
+        value = value[1]
+    return value
+
+def snapshot(html):
+    # parse HTML string, return the first element (outer HTML) or the document (page source)
+    soup = BeautifulSoup(html, 'html.parser')
+    first_element = soup.find(True)
+    if ((first_element is not None) & (first_element.name != 'html')):
+        return first_element
+    return soup
+
+def review_containers(element):
+    # all reviews in document order (same as the WebDriver list in the review loop)
+    return element.select('div.review-container')
+
+def has_element(element, css_selector):
+    return element.select_one(css_selector) is not None
+
+def text(element):
+    # visible text with collapsed whitespace (as returned by WebElement.text)
+    return re.sub(r'\s+', ' ', element.get_text()).strip()
+
+def find_by_own_text(element, tag_name, string, class_contains=None):
+    # replaces XPaths like .//div[contains(text(), "KÜCHEN")]
+    for candidate in element.find_all(tag_name):
+        if ((class_contains is not None)
+                & (class_contains not in ' '.join(candidate.get('class', [])))):
+            continue
+        own_text = candidate.find(string=True, recursive=False)
+        if ((own_text is not None) and (string in own_text)):
+            return candidate
+    return None
+
+def find_counts_item(element, string):
+    # replaces .//li[contains(@class, "countsReviewEnhancementsItem")]/span[contains(text(), ...)]
+    for item in element.select('li[class*="countsReviewEnhancementsItem"]'):
+        span = find_by_own_text(item, 'span', string)
+        if (span is not None):
+            return span
+    return None
+
+def member_description(element):
+    # replaces (.//ul[contains(@class, "memberdescriptionReviewEnhancements")]/li)[2]
+    return element.select('ul[class*="memberdescriptionReviewEnhancements"] > li')[1]
+
+def results_page_items(element):
+    # restaurants of a search results page in list order: (name, link) or None if the
+    # restaurant has no reviews (same rules as get_restaurant_info_from_results_page())
+    items = []
+    for res in element.select(
+            'div[data-test-target*="restaurants-list"] > div[data-test*="list_item"]'
+            ):
+        links = res.select('a[href*="Restaurant_Review"]')
+        if ((res.select_one('a[href*="#REVIEWS"]') is None) | (len(links) < 2)):
+            items.append(None)
+        else:
+            items.append((re.sub(r'[0-9]+\.\s', '', text(links[1])), links[1]['href']))
+    return items
+
+def next_page_link(element, page):
+    # (relative) link to the next results/reviews page, None on the last page
+    link = element.select_one(
+        'div[class*="pageNumbers"] a[data-page-number="' + str(page+1) + '"]'
+        )
+    if ((link is None) or (link.get('href') is None)):
+        return None
+    return link['href']
+
+def page_count(element):
+    # number of results/reviews pages (highest page number, 1 without pagination)
+    numbers = [
+        int(link['data-page-number']) 
+        for link in element.select('div[class*="pageNumbers"] [data-page-number]')
+        if (link['data-page-number'].isdigit())
+        ]
+    return max(numbers + [1])
+
+def page_url(url, page, per_page):
+    # direct URL of a results page (-oa<offset>-) or reviews page (-or<offset>-)
+    url = re.sub(r'-o[ar]\d+-', '-', url.split('#')[0])
+    if (page <= 1):
+        return url
+    offset = str((page-1) * per_page)
+    if ('-Reviews-' in url):
+        return url.replace('-Reviews-', '-Reviews-or' + offset + '-', 1)
+    return re.sub(r'(-g\d+)-', r'\1-oa' + offset + '-', url, count=1)
+
+def parse_data_attribute(element, attr, fallback):
+    # same attribute names, rules and fallback logic as fetch_data_attribute()
+    # element is a BeautifulSoup Tag (page, review container or member overlay)
+    try:
+        if (attr == 'name'):
+            value = text(element.select_one('[data-test-target="top-info-header"]'))
+        elif (attr == 'street_w_no'):
+            value = text(element.select_one('a[href*="#MAPVIEW"]')).split(', ', 1)
+            value = value[0]
+        elif (attr == 'postcode'):
+            value = text(element.select_one('a[href*="#MAPVIEW"]')).split(', ', 1)
+            value = re.sub(r'[^\d]+', '', value[1])
+        elif (attr in ['cuisine1', 'cuisine2', 'cuisine3']):
+            value = text(
+                find_by_own_text(element, 'div', 'KÜCHEN').find_next_sibling('div')
+                ).split(', ', 3)
+            value = value[int(attr[-1])-1]
+        elif (attr == 'pricerange_lo'):
+            value = text(
+                find_by_own_text(element, 'div', 'PREISSPANNE').find_next_sibling('div')
+                ).split(' - ', 1)
+            value = to_int(value[0])
+        elif (attr == 'pricerange_hi'):
+            value = text(
+                find_by_own_text(element, 'div', 'PREISSPANNE').find_next_sibling('div')
+                ).split(' - ', 1)
+            value = to_int(value[1])
+        elif (attr == 'review_user_name'):
+            if (fallback==0):
+                value = text(element.select_one('h3.username'))
+            else:
+                value = text(element.select_one('div[class*="member_info"] div.info_text > div'))
+        elif (attr in [
+                'review_user_gender', 'review_user_age', 'review_user_municipality', 
+                'review_user_country'
+                ]):
+            if (fallback==0):
+                value = user_description(text(member_description(element)), attr)
+            else:
+                value = np.nan
+        elif (attr == 'review_user_signup'):
+            if (fallback==0):
+                value = to_int(text(find_by_own_text(element, 'li', 'Tripadvisor-Mitglied seit')))
+            else:
+                value = np.nan
+        elif (attr == 'review_user_reviews'):
+            if (fallback==0):
+                value = to_int(text(find_counts_item(element, 'Beitr')))
+            else:
+                value = to_int(text(find_by_own_text(
+                    element.select_one('div[class*="member_info"]'), 'span', 'Bewertung'
+                    )))
+        elif (attr == 'review_user_thumbsup'):
+            if (fallback==0):
+                value = to_int(text(find_counts_item(element, 'Hilfreich')))
+            else:
+                value = np.nan
+        elif (attr == 'review_user_municipalities_visited'):
+            if (fallback==0):
+                value = to_int(text(find_counts_item(element, 'besuchte')))
+            else:
+                value = np.nan
+        elif (attr == 'review_user_overlay_failed'):
+            value = fallback
+        elif (attr == 'review_user_id'):
+            value = user_id_from_element_id(
+                element.select_one('div.memberOverlayLink.clickable')['id']
+                )
+        elif (attr == 'review_date'):
+            value = element.select_one('span.ratingDate')['title']
+        elif (attr == 'review_score'):
+            value = score_from_class(' '.join(element.select_one('span.ui_bubble_rating')['class']))
+        elif (attr == 'review_title'):
+            value = text(element.select_one('div.quote a span.noQuotes'))
+        elif (attr == 'review_text'):
+            value = text(element.select_one('div.entry p.partial_entry'))
+        elif (attr == 'review_id'):
+            value = element['data-reviewid']
+        elif (attr == 'review_language_markup'):
+            value = language_code(element.select_one('div.entry [lang], div.quote [lang]')['lang'])
+        else:
+            value = np.nan
+    except Exception:
+        value = np.nan
+    return value
+
+def convert(rule, raw):
+    # apply conversion rule to raw JavaScript value, missing or unparsable -> np.nan
+    if (raw is None):
+        return np.nan
+    try:
+        return rule(raw)
+    except Exception:
+        return np.nan
+
+def js_review_record(raw):
+    # raw review from the JavaScript extractor -> attribute values (incl. user fallback)
+    record = {
+        'review_user_id': convert(user_id_from_element_id, raw['user_element_id']),
+        'review_date': convert(str, raw['date']),
+        'review_score': convert(score_from_class, raw['rating_class']),
+        'review_title': convert(str, raw['title']),
+        'review_text': convert(str, raw['text']),
+        'review_id': convert(str, raw['review_id']),
+        'review_user_name': convert(str, raw['member_name']),
+        'review_user_reviews': convert(to_int, raw['member_reviews']),
+        'review_language_markup': convert(language_code, raw['lang']),
+        'translated': raw['translated'],
+        }
+    return record
+
+def js_overlay_record(raw):
+    # raw member overlay from the JavaScript extractor -> user attribute values
+    record = {
+        'review_user_name': convert(str, raw['username']),
+        'review_user_signup': convert(to_int, raw['signup']),
+        'review_user_reviews': convert(to_int, raw['reviews']),
+        'review_user_thumbsup': convert(to_int, raw['thumbsup']),
+        'review_user_municipalities_visited': convert(to_int, raw['visited']),
+        }
+    for attr in [
+            'review_user_gender', 'review_user_age', 'review_user_municipality', 
+            'review_user_country'
+            ]:
+        record[attr] = convert(lambda d: user_description(d, attr), raw['description'])
+    return record